@@ -0,0 +1,119 @@
+"""
+Read-replica routing.
+
+Enabled when ``REPLICA_DATABASE_URL`` is set. Reads made while handling a
+safe (GET/HEAD/OPTIONS) request go to the ``replica`` database; everything
+else (writes, unsafe requests, management commands, the requests that
+follow a request that wrote) uses ``default``. When the replica lags by more than
+``REPLICA_MAX_LAG`` seconds or cannot be reached, reads fall back to
+``default`` until the next lag check.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+REPLICA = "replica"
+PRIMARY = "default"
+
+# Apps whose rows are read right after being written by the same client
+PRIMARY_ONLY_APPS = {"sessions"}
+
+_state = threading.local()
+_lag = {"checked_at": 0.0, "seconds": 0.0}
+_lag_lock = threading.Lock()
+
+
+def replica_lag():
+    """ Replication lag of the replica in seconds, ``inf`` if it is unreachable """
+    connection = connections[REPLICA]
+    if connection.vendor != "postgresql":
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+            )
+            lag = cursor.fetchone()[0]
+    except DatabaseError:
+        return float("inf")
+    return float(lag or 0)
+
+
+def replica_is_fresh():
+    """ Whether the replica is within ``REPLICA_MAX_LAG``, re-checked at most
+    every ``REPLICA_LAG_CHECK_INTERVAL`` seconds per process. """
+    now = time.monotonic()
+    if now - _lag["checked_at"] >= settings.REPLICA_LAG_CHECK_INTERVAL:
+        with _lag_lock:
+            if now - _lag["checked_at"] >= settings.REPLICA_LAG_CHECK_INTERVAL:
+                _lag["seconds"] = replica_lag()
+                _lag["checked_at"] = now
+    return _lag["seconds"] <= settings.REPLICA_MAX_LAG
+
+
+def read_database():
+    """ Alias to read from outside the request/response cycle, for example
+    while a ``StreamingHttpResponse`` is being sent """
+    if REPLICA in settings.DATABASES and replica_is_fresh():
+        return REPLICA
+    return PRIMARY
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, "use_replica", False):
+            return PRIMARY
+        if model._meta.app_label in PRIMARY_ONLY_APPS or not replica_is_fresh():
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            # The middleware pins the client to the primary after this request
+            _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both databases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    """ Send the reads of safe requests to the replica.
+
+    A client that has just written (any unsafe request, or a safe one that
+    wrote through the router) gets a short-lived cookie keeping its reads on
+    the primary, so it sees its own writes after the redirect that usually
+    follows.
+    """
+    cookie_name = "primary_db"
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _state.use_replica = (
+            request.method in self.safe_methods
+            and self.cookie_name not in request.COOKIES
+        )
+        _state.wrote = False
+        try:
+            response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.use_replica = _state.wrote = False
+
+        if request.method not in self.safe_methods or wrote:
+            response.set_cookie(
+                self.cookie_name, "1",
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
@@ -27,8 +28,12 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
+# Settings profile: "production" (default) or "development"
+DJANGO_ENV = os.getenv("DJANGO_ENV", "production")
+PRODUCTION = DJANGO_ENV == "production"
+
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = not PRODUCTION
 
 ALLOWED_HOSTS = ["*"]
 
@@ -48,7 +53,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     'whitenoise.middleware.WhiteNoiseMiddleware',
-    "django.contrib.sessions.middleware.SessionMiddleware",
+    "voting.middleware.CompressionMiddleware",
+    "voting.middleware.VoterSessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -62,18 +68,32 @@ TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
         "DIRS": [],
-        "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
-                "django.template.context_processors.debug",
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
             ],
+            # Templates are read and compiled once per process; in development
+            # the autoreloader clears this cache when a template changes.
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
         },
     },
 ]
 
+if not PRODUCTION:
+    TEMPLATES[0]["OPTIONS"]["context_processors"].insert(
+        0, "django.template.context_processors.debug"
+    )
+
 WSGI_APPLICATION = "e_voting.wsgi.application"
 
 CSRF_TRUSTED_ORIGINS = ['https://onlinevoting-production.up.railway.app']
@@ -92,6 +112,92 @@ DATABASES = {
     "default": dj_database_url.config(default=DATABASE_URL, conn_max_age=1000)
 }
 
+# Optional read replica for result pages, lists and exports (see e_voting/db_routers.py)
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", 5))  # seconds
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", 5))  # seconds
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 10))  # reads stay on primary after a write
+
+if REPLICA_DATABASE_URL:
+    DATABASES["replica"] = dj_database_url.parse(REPLICA_DATABASE_URL, conn_max_age=1000)
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["e_voting.db_routers.ReplicaRouter"]
+    MIDDLEWARE.insert(0, "e_voting.db_routers.ReplicaRoutingMiddleware")
+
+# Receipt rate limits and cached receipts are shared by every worker with
+# CACHE_URL=redis://host:6379/0 (needs redis) or memcached://host:11211
+# (needs pymemcache). Without it production uses a database table (created
+# by `manage.py createcachetable` on release); per-process memory is only
+# good enough for development.
+CACHE_URL = os.getenv("CACHE_URL", "")
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}}
+elif CACHE_URL.startswith("memcached://"):
+    CACHES = {"default": {
+        "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+        "LOCATION": CACHE_URL[len("memcached://"):],
+    }}
+elif PRODUCTION:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "e_voting_cache"}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "e-voting"}}
+# Receipt lookup limits count in Redis or Memcached when there is one. A
+# database cache would take a write, and race, on every lookup, so without
+# them each process counts its clients on its own.
+if CACHES["default"]["BACKEND"].endswith(("RedisCache", "PyMemcacheCache")):
+    CACHES["ratelimit"] = dict(CACHES["default"], KEY_PREFIX="ratelimit")
+else:
+    CACHES["ratelimit"] = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "e-voting-ratelimit"}
+
+# Sessions: "db", "cached_db" or "signed_cookies". cached_db is the default
+# only with a CACHE_URL: a per-process or database cache in front of the
+# session table would serve stale sessions, or just add a query.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "cached_db" if CACHE_URL else "db")
+SESSION_ENGINE = f"django.contrib.sessions.backends.{SESSION_BACKEND}"
+
+# Messages: "cookie" (default), "session" or "fallback"
+MESSAGE_BACKEND = os.getenv("MESSAGE_BACKEND", "cookie")
+MESSAGE_STORAGE = {
+    "cookie": "django.contrib.messages.storage.cookie.CookieStorage",
+    "session": "django.contrib.messages.storage.session.SessionStorage",
+    "fallback": "django.contrib.messages.storage.fallback.FallbackStorage",
+}[MESSAGE_BACKEND]
+
+# Voter-facing views that never touch the session store
+SESSIONLESS_VIEWS = ["voting:vote", "voting:vote-success", "voting:receipt"]
+
+# Response compression (voting.middleware.CompressionMiddleware); brotli is
+# used when the package is installed, gzip otherwise
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))  # bytes
+COMPRESSIBLE_CONTENT_TYPES = [
+    "text/html", "text/plain", "text/csv", "application/json", "application/x-ndjson",
+]
+BROTLI_QUALITY = 5  # of 0-11; higher costs far more CPU per response for little gain
+
+# Longest time browsers and shared caches may keep the results of a closed
+# poll; results of an open poll are always revalidated
+RESULTS_CACHE_SECONDS = int(os.getenv("RESULTS_CACHE_SECONDS", 300))
+# Ranked and approval counts are cached per ballot count, so this only
+# bounds how long a superseded count takes up cache space
+COUNT_CACHE_SECONDS = int(os.getenv("COUNT_CACHE_SECONDS", 24 * 60 * 60))
+
+# Region assumed for phone numbers written without a country code (e.g. "NG");
+# unset, they must be in international format
+PHONENUMBER_DEFAULT_REGION = os.getenv("PHONENUMBER_DEFAULT_REGION") or None
+
+# Public receipt lookups: requests per client IP per minute, and how long a
+# found receipt is cached (it never changes once issued)
+RECEIPT_LOOKUPS_PER_MINUTE = int(os.getenv("RECEIPT_LOOKUPS_PER_MINUTE", 20))
+RECEIPT_CACHE_SECONDS = int(os.getenv("RECEIPT_CACHE_SECONDS", 3600))
+
+# Live tallies in shared memory (voting.tally): counters per candidate slot
+# and one stripe per worker process, so TALLY_STRIPES should be at least
+# WEB_CONCURRENCY; reconciled with the database every TALLY_RECONCILE_SECONDS
+LIVE_TALLY = os.getenv("LIVE_TALLY", "1") != "0"
+TALLY_CANDIDATE_SLOTS = int(os.getenv("TALLY_CANDIDATE_SLOTS", 64))
+TALLY_STRIPES = int(os.getenv("TALLY_STRIPES", 64))
+TALLY_RECONCILE_SECONDS = int(os.getenv("TALLY_RECONCILE_SECONDS", 30))
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -132,6 +238,15 @@ STATICFILES_DIRS = [
      ]
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Uploaded files (candidate photos, see voting.images)
+MEDIA_URL = "media/"
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+# Django serves the processed candidate photos under MEDIA_URL itself unless
+# SERVE_MEDIA is set empty or "0"; in production set MEDIA_URL to the
+# object storage (or a CDN in front of it) holding them instead
+SERVE_MEDIA = os.getenv("SERVE_MEDIA", "1") not in ("", "0")
+MEDIA_CACHE_SECONDS = 365 * 24 * 60 * 60  # for content-hashed names
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -146,3 +261,29 @@ EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "root": {"handlers": ["console"], "level": "INFO"},
+    "loggers": {
+        # SQL logging only in development with SQL_DEBUG=1
+        "django.db.backends": {
+            "level": "DEBUG" if not PRODUCTION and os.getenv("SQL_DEBUG") else "WARNING",
+            "propagate": True,
+        },
+    },
+}
+
+# Cold storage for votes and voters of old polls (see `manage.py archive_polls`)
+ARCHIVE_ROOT = Path(os.environ.get('ARCHIVE_ROOT', BASE_DIR / 'archives'))
+# Any storage backend, e.g. ARCHIVE_STORAGE_BACKEND=storages.backends.s3.S3Storage
+# with ARCHIVE_STORAGE_OPTIONS='{"bucket_name": "poll-archives"}'; the
+# default keeps archives on local disk under ARCHIVE_ROOT
+ARCHIVE_STORAGE = {
+    "BACKEND": os.environ.get('ARCHIVE_STORAGE_BACKEND', 'django.core.files.storage.FileSystemStorage'),
+    "OPTIONS": json.loads(os.environ.get('ARCHIVE_STORAGE_OPTIONS') or 'null') or {"location": str(ARCHIVE_ROOT)},
+}
@@ -0,0 +1,55 @@
+"""
+Warm-up run before a web process accepts traffic.
+
+With ``preload_app`` gunicorn runs it once in the master, so every forked
+worker starts with the views imported and the templates already compiled.
+"""
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist, TemplateSyntaxError
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+
+def template_names():
+    """ Names of the project's own templates, as passed to ``get_template`` """
+    for app_config in apps.get_app_configs():
+        if not app_config.path.startswith(str(settings.BASE_DIR)):
+            continue
+        directory = Path(app_config.path) / "templates"
+        for path in sorted(directory.rglob("*.html")):
+            yield path.relative_to(directory).as_posix()
+
+
+def compile_templates():
+    compiled = 0
+    for name in template_names():
+        try:
+            get_template(name)
+        except (TemplateDoesNotExist, TemplateSyntaxError):
+            continue
+        compiled += 1
+    return compiled
+
+
+def open_connections():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def close_connections():
+    for connection in connections.all():
+        connection.close()
+
+
+def warm_up(connect=True):
+    """ Import every view through the URLconf, compile the templates and,
+    if ``connect``, open the database connections. """
+    get_resolver().url_patterns
+    compiled = compile_templates()
+    if connect:
+        open_connections()
+    return compiled
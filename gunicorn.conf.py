@@ -0,0 +1,40 @@
+"""
+Gunicorn settings for the web process (picked up automatically from the
+working directory). Migrations and collectstatic run in the release phase,
+see the Procfile.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Load Django once in the master and fork warm workers from it
+preload_app = True
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 2))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+keepalive = 5
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = 100
+
+accesslog = "-"
+
+
+def when_ready(server):
+    from e_voting.warmup import close_connections, warm_up
+    from voting import tally
+
+    compiled = warm_up(connect=False)
+    # Live tallies start from the database, never from a previous run's memory
+    rebuilt = tally.rebuild_all()
+    # Connections must not be shared with the forked workers. Django keeps
+    # one per thread, so each request thread opens its own on first use
+    # (and keeps it for CONN_MAX_AGE); none is opened ahead in the workers.
+    close_connections()
+    server.log.info("Warm-up done: %d templates compiled, %d live tallies rebuilt", compiled, rebuilt)
+
+
+def on_exit(server):
+    from voting import tally
+
+    tally.drop_all()
@@ -1,6 +1,193 @@
-from django.contrib import admin
-from voting.models import Poll, Candidate, Voter
-# Register your models here.
-admin.site.register(Poll)
-admin.site.register(Candidate)
-admin.site.register(Voter)
\ No newline at end of file
+import csv
+
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models.query import QuerySet
+from django.http import StreamingHttpResponse
+from django.utils.functional import cached_property
+
+from voting.models import Candidate, Poll, Vote, Voter, normalize_receipt_code
+from voting.views import Echo, send_poll_invitations
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Paginator that estimates large counts instead of running ``COUNT(*)``
+
+    On PostgreSQL an unfiltered changelist uses the planner's row count for
+    the table (``pg_class.reltuples``) and a filtered one the row estimate
+    of its EXPLAIN. SQLite keeps no statistics, so its highest rowid stands
+    in for the size of an unfiltered table there. Estimates below
+    ``exact_count_threshold`` are replaced by an exact count, which is cheap
+    at that size; above it the last pages may come out short or empty.
+    """
+    exact_count_threshold = 10000
+
+    def estimate(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return None
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        unfiltered = not queryset.query.where
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                if unfiltered:
+                    cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass", [table])
+                    row = cursor.fetchone()
+                    # -1 until the table has been vacuumed or analyzed
+                    return int(row[0]) if row and row[0] >= 0 else None
+                sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                return int(plan[0]["Plan"]["Plan Rows"])
+            if connection.vendor == "sqlite" and unfiltered:
+                cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+                return cursor.fetchone()[0] or 0
+        return None
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+
+class TunedModelAdmin(admin.ModelAdmin):
+    """ Changelist defaults for tables that grow large """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class SoftDeleteAdmin(TunedModelAdmin):
+    """ Admin for models with ``all_objects``: soft-deleted rows stay listed
+    (filter on "is deleted") and the bulk actions soft delete and restore
+    them in chunks rather than deleting. """
+    actions = ["soft_delete_selected", "restore_selected"]
+
+    def get_queryset(self, request):
+        queryset = self.model.all_objects.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # The stock action collects every related row to list them first
+        actions.pop("delete_selected", None)
+        return actions
+
+    @admin.action(description="Soft delete selected %(verbose_name_plural)s",
+                  permissions=["delete"])
+    def soft_delete_selected(self, request, queryset):
+        count = queryset.soft_delete()
+        self.message_user(request, f"{count} row(s) soft deleted.", messages.SUCCESS)
+
+    @admin.action(description="Restore selected %(verbose_name_plural)s",
+                  permissions=["change"])
+    def restore_selected(self, request, queryset):
+        count = queryset.restore()
+        self.message_user(request, f"{count} row(s) restored.", messages.SUCCESS)
+
+
+@admin.register(Poll)
+class PollAdmin(SoftDeleteAdmin):
+    list_display = ["name", "voting_method", "seats", "start_time", "end_time", "is_deleted"]
+    list_filter = ["voting_method", "is_deleted"]
+    search_fields = ["=name"]
+    search_help_text = "Exact poll name (case insensitive)"
+
+    @admin.action(description="Soft delete selected polls and their voters",
+                  permissions=["delete"])
+    def soft_delete_selected(self, request, queryset):
+        with transaction.atomic():
+            # Voters first: the selection may be filtered on is_deleted
+            Voter.all_objects.filter(poll__in=queryset.values("pk")).soft_delete()
+            count = queryset.soft_delete()
+        self.message_user(request, f"{count} poll(s) soft deleted.", messages.SUCCESS)
+
+
+@admin.register(Candidate)
+class CandidateAdmin(TunedModelAdmin):
+    list_display = ["name", "poll"]
+    list_select_related = ["poll"]
+    list_filter = ["poll"]
+    raw_id_fields = ["poll"]
+    search_fields = ["=name"]
+    search_help_text = "Exact candidate name (case insensitive)"
+
+
+@admin.register(Voter)
+class VoterAdmin(SoftDeleteAdmin):
+    list_display = ["email", "first_name", "last_name", "poll", "is_voted", "email_sent", "is_deleted"]
+    list_select_related = ["poll"]
+    list_filter = ["poll", "is_voted", "email_sent", "is_deleted"]
+    raw_id_fields = ["poll"]
+    # Exact lookups only: UPPER(column) = UPPER(term) is served by the
+    # voter_email_upper_idx / voter_last_name_upper_idx expression indexes,
+    # where a "contains" search would scan the table
+    search_fields = ["=email", "=last_name"]
+    search_help_text = "Exact email address or last name (case insensitive)"
+    actions = SoftDeleteAdmin.actions + ["resend_invitations"]
+
+    @admin.action(description="Resend ballot invitations to selected voters",
+                  permissions=["change"])
+    def resend_invitations(self, request, queryset):
+        queryset = queryset.filter(is_deleted=False, is_voted=False)
+        poll_ids = queryset.order_by().values_list("poll_id", flat=True).distinct()
+        for poll in Poll.objects.filter(pk__in=list(poll_ids)):
+            send_poll_invitations(request, poll, queryset.filter(poll=poll))
+
+
+@admin.register(Vote)
+class VoteAdmin(TunedModelAdmin):
+    """ Read-only: votes are only cast through the ballot, and changing or
+    deleting one would break its poll's ledger """
+    list_display = ["receipt_code", "poll", "candidate", "date_created"]
+    list_select_related = ["poll", "candidate"]
+    list_filter = ["poll"]
+    raw_id_fields = ["poll", "candidate", "voted_by"]
+    readonly_fields = ["poll", "candidate", "voted_by", "date_created", "receipt_code"]
+    # Sorting on anything else would sort the whole table for every page
+    sortable_by = ["date_created"]
+    ordering = ["-pk"]
+    search_fields = ["receipt_code"]
+    search_help_text = "Receipt code"
+    actions = ["export_csv"]
+    export_chunk_size = 2000
+
+    def get_search_results(self, request, queryset, search_term):
+        # An exact match on the unique receipt_code index, not a LIKE scan
+        if not search_term.strip():
+            return queryset, False
+        code = normalize_receipt_code(search_term)
+        if code is None:
+            return queryset.none(), False
+        return queryset.filter(receipt_code=code), False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Export selected votes as CSV", permissions=["view"])
+    def export_csv(self, request, queryset):
+        columns = ["receipt_code", "poll_id", "candidate_id", "voted_by_id", "date_created"]
+        rows = queryset.order_by("pk").values_list(*columns).iterator(chunk_size=self.export_chunk_size)
+
+        def stream():
+            writer = csv.writer(Echo())
+            yield writer.writerow(columns)
+            for row in rows:
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(stream(), content_type="text/csv")
+        response["Content-Disposition"] = 'attachment; filename="votes.csv"'
+        return response
@@ -0,0 +1,320 @@
+""" Cold storage of votes and voters for old polls.
+
+Archives are written through the storage configured by
+``settings.ARCHIVE_STORAGE`` (local disk under ``ARCHIVE_ROOT`` by default),
+one prefix per archive run::
+
+    poll-<id>/<timestamp>/
+        manifest.json      columns, row counts, checksums and results snapshot
+        voters.jsonl.gz    one JSON array per voter, in manifest column order
+        votes.jsonl.gz     one JSON array per vote, in manifest column order
+        ballots.jsonl.gz   ranked/approval ballots, rankings hex-encoded
+"""
+import gzip
+import hashlib
+import json
+import posixpath
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from voting import ledger, tally
+from voting.counting import count_poll
+from voting.models import Ballot, Poll, PollArchive, Vote, Voter
+
+FORMAT_VERSION = 1
+
+VOTER_COLUMNS = [
+    "uuid", "email", "first_name", "last_name", "phone_number",
+    "is_voted", "email_sent", "is_deleted", "deleted_at", "date_created",
+]
+VOTE_COLUMNS = ["id", "candidate_id", "voted_by_id", "date_created", "receipt_code"]
+BALLOT_COLUMNS = ["vote_id", "rankings"]
+
+
+def archive_storage():
+    """ The storage archives are written to, from ``settings.ARCHIVE_STORAGE`` """
+    config = settings.ARCHIVE_STORAGE
+    return import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+
+
+def _encode(value):
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def _write_rows(path, queryset, columns, chunk_size):
+    """ Stream ``columns`` of ``queryset`` into a gzip'd JSONL file.
+
+    Returns the number of rows written.
+    """
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8") as fh:
+        for row in queryset.values_list(*columns).iterator(chunk_size=chunk_size):
+            fh.write(json.dumps([_encode(value) for value in row]))
+            fh.write("\n")
+            count += 1
+    return count
+
+
+def _read_rows(storage, name, columns):
+    with storage.open(name, "rb") as raw, gzip.open(raw, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            yield dict(zip(columns, json.loads(line)))
+
+
+def _sha256(fh):
+    digest = hashlib.sha256()
+    for block in iter(lambda: fh.read(1 << 20), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def _stored_sha256(storage, name):
+    with storage.open(name, "rb") as fh:
+        return _sha256(fh)
+
+
+def _upload(storage, name, path):
+    """ Save the local file ``path`` to ``storage`` as ``name`` and read it
+    back; returns its sha256 once the stored copy is known to match. Nothing
+    is left in storage when it raises. """
+    with open(path, "rb") as fh:
+        checksum = _sha256(fh)
+        fh.seek(0)
+        saved = storage.save(name, File(fh))
+    if saved != name:
+        storage.delete(saved)
+        raise ValueError(f"{name} already exists in archive storage")
+    if _stored_sha256(storage, name) != checksum:
+        storage.delete(name)
+        raise ValueError(f"{name} was not stored intact")
+    return checksum
+
+
+def delete_in_batches(queryset, batch_size):
+    """ Delete the rows of ``queryset`` ``batch_size`` primary keys at a time,
+    each batch in its own transaction, so locks are held one batch at a time.
+    Not to be called inside a transaction. """
+    deleted = 0
+    manager = queryset.model._base_manager
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        with transaction.atomic():
+            manager.filter(pk__in=pks).delete()
+        deleted += len(pks)
+
+
+def results_snapshot(poll):
+    """ Votes per candidate id and the elected candidate ids, as stored on
+    ``PollArchive.results`` and ``PollArchive.winners``. Ranked and approval
+    polls are counted from their ballots, their results being the first
+    round's: a vote only records the first choice. """
+    if poll.uses_ballots:
+        result = count_poll(poll)
+        if not result["ballots"]:
+            return {}, []
+        first_round = result["rounds"][0] if result["rounds"] else {}
+        return {str(candidate_id): int(votes) for candidate_id, votes in first_round.items()}, result["elected"]
+    counts = (
+        Vote.objects.filter(poll=poll)
+        .values_list("candidate_id")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    results = {str(candidate_id): total for candidate_id, total in counts}
+    highest_votes = max(results.values(), default=0)
+    return results, [int(candidate_id) for candidate_id, total in results.items() if total == highest_votes]
+
+
+def archived_voters(archive):
+    """ The voters an archive run exported: those of the poll registered
+    before it started """
+    return Voter._base_manager.filter(poll_id=archive.poll_id, date_created__lte=archive.archived_at)
+
+
+def _export(poll, chunk_size, storage):
+    """ Write the rows of ``poll`` to storage and commit its (incomplete)
+    ``PollArchive``. Nothing is left in storage if it raises. """
+    archived_at = timezone.now()
+    location = f"poll-{poll.pk}/{archived_at:%Y%m%dT%H%M%S%f}"
+    voters = Voter._base_manager.filter(poll=poll, date_created__lte=archived_at).order_by("pk")
+    votes = Vote._base_manager.filter(poll=poll).order_by("pk")
+    ballots = Ballot.objects.filter(poll=poll).order_by("pk")
+    stored = []
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            results, winners = results_snapshot(poll)
+            files = {}
+            for key, queryset, columns in [("voters", voters, VOTER_COLUMNS),
+                                           ("votes", votes, VOTE_COLUMNS),
+                                           ("ballots", ballots, BALLOT_COLUMNS)]:
+                filename = f"{key}.jsonl.gz"
+                rows = _write_rows(Path(workdir) / filename, queryset, columns, chunk_size)
+                name = posixpath.join(location, filename)
+                checksum = _upload(storage, name, Path(workdir) / filename)
+                stored.append(name)
+                files[key] = {"name": filename, "columns": columns, "rows": rows, "sha256": checksum}
+
+            manifest = {
+                "format_version": FORMAT_VERSION,
+                "poll": {"id": poll.pk, "name": poll.name},
+                "archived_at": archived_at.isoformat(),
+                "results": results,
+                "winners": winners,
+                "files": files,
+            }
+            with tempfile.NamedTemporaryFile("w", dir=workdir, delete=False) as fh:
+                json.dump(manifest, fh, indent=2)
+            name = posixpath.join(location, "manifest.json")
+            _upload(storage, name, fh.name)
+            stored.append(name)
+
+        with transaction.atomic():
+            # Votes wait for this lock, and are refused once the archive exists
+            ledger.lock_poll(poll.pk)
+            live = {"voters": voters.count(), "votes": votes.count(), "ballots": ballots.count()}
+            if any(files[key]["rows"] != count for key, count in live.items()):
+                raise ValueError(f"{poll} changed while it was being exported")
+            archive, _ = PollArchive.objects.update_or_create(
+                poll=poll,
+                defaults={
+                    "location": location,
+                    "voter_count": files["voters"]["rows"],
+                    "vote_count": files["votes"]["rows"],
+                    "results": results,
+                    "winners": winners,
+                    "archived_at": archived_at,
+                    "completed_at": None,
+                    "restored_at": None,
+                },
+            )
+    except BaseException:
+        for name in stored:
+            storage.delete(name)
+        raise
+    return archive
+
+
+def archive_poll(poll, chunk_size=2000, storage=None):
+    """ Export the votes and voters of ``poll`` to archive storage and remove
+    them from the live tables.
+
+    The files are written and read back from storage outside any
+    transaction. The ``PollArchive`` is then committed on its own, once the
+    live rows are found to match the export; from then on the poll takes no
+    votes. The rows are deleted last, ``chunk_size`` at a time, each batch in
+    a transaction of its own, and the archive is marked complete. A run
+    interrupted while deleting carries on from there when called again. A
+    restored poll can be archived again; its earlier archive is left in
+    storage.
+    """
+    storage = storage or archive_storage()
+    archive = PollArchive.objects.filter(poll=poll).first()
+    if archive is not None and archive.is_complete and not archive.is_restored:
+        raise ValueError(f"{poll} is already archived")
+    if archive is None or archive.is_complete:
+        archive = _export(poll, chunk_size, storage)
+
+    # Votes first: deleting voters would otherwise cascade into them row by row
+    delete_in_batches(Ballot.objects.filter(poll=poll).order_by("pk"), chunk_size)
+    delete_in_batches(Vote._base_manager.filter(poll=poll).order_by("pk"), chunk_size)
+    delete_in_batches(archived_voters(archive).order_by("pk"), chunk_size)
+    archive.completed_at = timezone.now()
+    archive.save(update_fields=["completed_at"])
+    tally.drop(poll.pk)
+    return archive
+
+
+def _restore_rows(model, rows, batch_size, timestamp_fields):
+    """ Bulk insert ``rows`` and put back the timestamps that
+    ``auto_now``/``auto_now_add`` overwrite on insert. """
+    batch = []
+
+    def flush():
+        originals = [{name: getattr(obj, name) for name in timestamp_fields} for obj in batch]
+        model.objects.bulk_create(batch)
+        for obj, values in zip(batch, originals):
+            for name, value in values.items():
+                setattr(obj, name, value)
+        model._base_manager.bulk_update(batch, timestamp_fields)
+        batch.clear()
+
+    for row in rows:
+        for name in timestamp_fields:
+            row[name] = parse_datetime(row[name]) if row[name] else None
+        batch.append(model(**row))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+
+def load_manifest(storage, location):
+    with storage.open(posixpath.join(location, "manifest.json"), "rb") as fh:
+        manifest = json.load(fh)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported archive format: {manifest.get('format_version')}")
+    return manifest
+
+
+def restore_poll(poll, batch_size=2000, storage=None):
+    """ Reload the archived votes and voters of ``poll`` into the live tables.
+
+    Raises ``ValueError``, with nothing restored, when a file fails its
+    checksum or a row clashes with live data (e.g. the email of an archived
+    voter has been registered again since).
+    """
+    storage = storage or archive_storage()
+    archive = poll.archive
+    if not archive.is_complete:
+        raise ValueError(f"archiving {poll} has not finished; run archive_polls for it again")
+    manifest = load_manifest(storage, archive.location)
+    files = {key: dict(spec, name=posixpath.join(archive.location, spec["name"]))
+             for key, spec in manifest["files"].items()}
+
+    for spec in files.values():
+        if _stored_sha256(storage, spec["name"]) != spec["sha256"]:
+            raise ValueError(f"Checksum mismatch for {spec['name']}")
+
+    try:
+        with transaction.atomic():
+            _restore_rows(
+                Voter,
+                (dict(row, poll_id=poll.pk) for row in
+                 _read_rows(storage, files["voters"]["name"], files["voters"]["columns"])),
+                batch_size,
+                ["deleted_at", "date_created"],
+            )
+            _restore_rows(
+                Vote,
+                (dict(row, poll_id=poll.pk) for row in
+                 _read_rows(storage, files["votes"]["name"], files["votes"]["columns"])),
+                batch_size,
+                ["date_created"],
+            )
+            Ballot.objects.bulk_create(
+                (Ballot(poll_id=poll.pk, vote_id=row["vote_id"], rankings=bytes.fromhex(row["rankings"]))
+                 for row in _read_rows(storage, files["ballots"]["name"], files["ballots"]["columns"])),
+                batch_size=batch_size,
+            )
+            archive.restored_at = timezone.now()
+            archive.save(update_fields=["restored_at"])
+    except IntegrityError as e:
+        raise ValueError(f"archived rows clash with live data: {e}") from e
+    return archive
@@ -0,0 +1,168 @@
+""" Counting engines for ranked-choice (IRV/STV) and approval polls.
+
+Ballots are loaded once into a ``(ballots, max_rank)`` integer matrix of
+candidate positions, padded with ``len(candidate_ids)``, and every round
+is computed on that matrix with NumPy; the database is never queried
+again while counting.
+"""
+import hashlib
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max
+
+from voting.models import Ballot
+
+# Candidate ids are packed into ``Ballot.rankings`` as little-endian uint32
+BALLOT_DTYPE = np.dtype("<u4")
+
+
+def pack_rankings(candidate_ids):
+    """ Pack an ordered list of candidate ids for ``Ballot.rankings`` """
+    return np.asarray(candidate_ids, dtype=BALLOT_DTYPE).tobytes()
+
+
+def unpack_rankings(data):
+    return [int(candidate_id) for candidate_id in np.frombuffer(bytes(data), dtype=BALLOT_DTYPE)]
+
+
+def ballot_matrix(packed_ballots, candidate_ids):
+    """ Build the ballot matrix from packed rankings.
+
+    ``candidate_ids`` must be sorted. Ids that are not in it (for example a
+    removed candidate) are dropped from the ballots, preserving order.
+    """
+    candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+    padding = len(candidate_ids)
+    lengths = np.fromiter((len(data) for data in packed_ballots), dtype=np.int64,
+                          count=len(packed_ballots)) // BALLOT_DTYPE.itemsize
+    if not padding or not len(lengths) or not lengths.max():
+        return np.full((len(lengths), 1), padding, dtype=np.int32)
+
+    ids = np.frombuffer(b"".join(bytes(data) for data in packed_ballots),
+                        dtype=BALLOT_DTYPE).astype(np.int64)
+    positions = np.searchsorted(candidate_ids, ids)
+    positions[positions >= padding] = padding
+    unknown = candidate_ids[np.minimum(positions, padding - 1)] != ids
+    positions[unknown] = padding
+
+    # Scatter the flat preference list into one row per ballot
+    rows = np.repeat(np.arange(len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    columns = np.arange(len(ids)) - np.repeat(starts, lengths)
+    matrix = np.full((len(lengths), int(lengths.max())), padding, dtype=np.int32)
+    matrix[rows, columns] = positions
+
+    # Move the preferences that follow a dropped id left to close the gap
+    order = np.argsort(matrix == padding, axis=1, kind="stable")
+    return np.take_along_axis(matrix, order, axis=1)
+
+
+def first_preferences(matrix, hopeful):
+    """ Position of each ballot's highest-ranked hopeful candidate, -1 if exhausted """
+    continuing = np.append(hopeful, False)[matrix]
+    has_choice = continuing.any(axis=1)
+    choice = matrix[np.arange(len(matrix)), continuing.argmax(axis=1)]
+    return np.where(has_choice, choice, -1)
+
+
+def count_approval(matrix, candidate_count, seats=1):
+    """ Elect the ``seats`` candidates approved on the most ballots """
+    approvals = matrix[matrix < candidate_count]
+    tallies = np.bincount(approvals, minlength=candidate_count).astype(float)
+    # Stable sort on negated tallies keeps ties in candidate order
+    elected = np.argsort(-tallies, kind="stable")[:seats]
+    return {"elected": [int(c) for c in elected], "rounds": [tallies]}
+
+
+def count_stv(matrix, candidate_count, seats=1):
+    """ Single transferable vote with fractional surplus transfer.
+
+    With one seat this is instant-runoff voting: a candidate needs a
+    majority of the ballots still in play. With more seats the Droop quota
+    of the first round applies. Each round's tallies are kept in ``rounds``.
+    """
+    weights = np.ones(len(matrix))
+    hopeful = np.ones(candidate_count, dtype=bool)
+    elected = []
+    rounds = []
+    quota = None
+
+    while len(elected) < seats and hopeful.any():
+        top = first_preferences(matrix, hopeful)
+        live = top >= 0
+        tallies = np.bincount(top[live], weights=weights[live], minlength=candidate_count)
+        rounds.append(tallies)
+
+        if hopeful.sum() <= seats - len(elected):
+            remaining = np.flatnonzero(hopeful)
+            elected.extend(int(c) for c in remaining[np.argsort(-tallies[remaining], kind="stable")])
+            break
+
+        if seats == 1:
+            quota = np.floor(weights[live].sum() / 2) + 1
+        elif quota is None:
+            quota = np.floor(weights[live].sum() / (seats + 1)) + 1
+
+        reached = np.flatnonzero(hopeful & (tallies >= quota))
+        if len(reached):
+            for candidate in reached[np.argsort(-tallies[reached], kind="stable")]:
+                if len(elected) == seats:
+                    break
+                elected.append(int(candidate))
+                hopeful[candidate] = False
+                # Pass the surplus on at a reduced weight
+                weights[top == candidate] *= (tallies[candidate] - quota) / tallies[candidate]
+            continue
+
+        # Nobody reached the quota: eliminate the weakest hopeful candidate
+        hopeful[np.where(hopeful, tallies, np.inf).argmin()] = False
+
+    return {"elected": elected, "rounds": rounds}
+
+
+def count_ballots(method, matrix, candidate_count, seats=1):
+    if method == "approval":
+        return count_approval(matrix, candidate_count, seats)
+    return count_stv(matrix, candidate_count, seats if method == "stv" else 1)
+
+
+def count_poll(poll):
+    """ Count a ranked or approval poll from its stored ballots.
+
+    Returns the elected candidate ids and, per round, a mapping of candidate
+    id to (possibly fractional) votes.
+    """
+    candidate_ids = sorted(poll.candidates.values_list("id", flat=True))
+    packed = list(Ballot.objects.filter(poll=poll).values_list("rankings", flat=True).iterator())
+    matrix = ballot_matrix(packed, candidate_ids)
+    result = count_ballots(poll.voting_method, matrix, len(candidate_ids), poll.seats)
+    return {
+        "elected": [candidate_ids[position] for position in result["elected"]],
+        "rounds": [
+            {candidate_id: float(votes) for candidate_id, votes in zip(candidate_ids, tallies)}
+            for tallies in result["rounds"]
+        ],
+        "ballots": len(packed),
+    }
+
+
+def cached_count_poll(poll):
+    """ ``count_poll``, computed once per state of the poll.
+
+    The cache key holds the poll's ballot count and last ballot (vote) id,
+    its counting rules and its candidates, so a cached count is never stale
+    and one aggregate query replaces loading and counting every ballot.
+    """
+    candidates = ",".join(str(pk) for pk in sorted(poll.candidates.values_list("id", flat=True)))
+    ballots = Ballot.objects.filter(poll=poll).aggregate(count=Count("pk"), last=Max("pk"))
+    key = "poll-count:{}:{}:{}:{}:{}:{}".format(
+        poll.pk, poll.voting_method, poll.seats, ballots["count"], ballots["last"],
+        hashlib.sha1(candidates.encode()).hexdigest(),
+    )
+    result = cache.get(key)
+    if result is None:
+        result = count_poll(poll)
+        cache.set(key, result, timeout=settings.COUNT_CACHE_SECONDS)
+    return result
@@ -1,10 +1,9 @@
 from django import forms
-from .models import Candidate, Voter, Poll
+from .models import Candidate, Voter, Poll, User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth.models import User
 
 
 
@@ -14,12 +13,14 @@ class PollForm(forms.ModelForm):
 
     class Meta:
         model = Poll
-        fields = ["name", "description","start_time", "end_time"]
+        fields = ["name", "description","start_time", "end_time", "voting_method", "seats"]
         widgets = {
             'name': forms.TextInput(attrs={'class':'form-control','placeholder': 'name'}),
             'description': forms.Textarea(attrs={'class':'form-control form-control-lg','placeholder': 'description'}),
             'start_time': forms.TimeInput(attrs={'class':'form-control','placeholder': 'start time'}),
             'end_time': forms.TimeInput(attrs={'class': 'form-contol' ,'placeholder': 'end time'}),
+            'voting_method': forms.Select(attrs={'class': 'form-select'}),
+            'seats': forms.NumberInput(attrs={'class': 'form-control', 'min': 1}),
         }
 
 
@@ -0,0 +1,153 @@
+""" Candidate photo pipeline.
+
+The request that receives an upload only stores it. Once its transaction
+commits, a background thread (or ``process_candidate_images`` for a
+backfill) re-encodes the photo without its metadata and renders thumbnails
+at ``THUMBNAIL_WIDTHS`` as WebP and JPEG. Every file is named after a hash
+of its content::
+
+    candidates/<hash>.<ext>            the cleaned original
+    candidates/<hash>-<width>w.<ext>   thumbnails
+
+so a name never points at different bytes and can be cached forever.
+"""
+import hashlib
+import io
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from voting.models import Candidate
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "candidates"
+THUMBNAIL_WIDTHS = (96, 192, 384)
+ORIGINAL_MAX_WIDTH = 1600
+THUMBNAIL_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 6}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+# Names written by _store, the only files serve_media hands out
+PROCESSED_NAME = re.compile(rf"^{UPLOAD_DIR}/[0-9a-f]{{16}}(?:-\d+w)?\.(jpg|png|webp)$")
+CONTENT_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+# One worker: resizing is CPU-bound and must not compete with requests
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="candidate-images")
+
+
+def output_formats():
+    # WebP needs a Pillow built against libwebp
+    return [name for name in THUMBNAIL_FORMATS if name != "webp" or features.check("webp")]
+
+
+def processed_content_type(name):
+    """ Content type of a processed photo or thumbnail, None for any
+    other name """
+    match = PROCESSED_NAME.match(name)
+    return CONTENT_TYPES[match.group(1)] if match else None
+
+
+def _encode(image, pillow_format, options):
+    buffer = io.BytesIO()
+    if pillow_format == "JPEG" and image.mode != "RGB":
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A") if "A" in image.mode else None)
+        image = background
+    # Saving a fresh image without exif/icc arguments drops all metadata
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def _store(data, suffix, extension):
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    name = f"{UPLOAD_DIR}/{digest}{suffix}.{extension}"
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def _resize(image, width):
+    if image.width <= width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def render_images(source):
+    """ Clean original and thumbnails of the image in file object ``source``.
+
+    Returns ``(original name, thumbnails)`` where thumbnails maps format to
+    ``{width: storage name}``.
+    """
+    with Image.open(source) as opened:
+        # Apply the EXIF orientation before the EXIF block is dropped
+        image = ImageOps.exif_transpose(opened)
+        image = image.convert("RGBA" if "A" in image.getbands() or "transparency" in opened.info else "RGB")
+
+    original = _resize(image, ORIGINAL_MAX_WIDTH)
+    if original.mode == "RGBA":
+        original_name = _store(_encode(original, "PNG", {"optimize": True}), "", "png")
+    else:
+        original_name = _store(_encode(original, "JPEG", {"quality": 90, "optimize": True}), "", "jpg")
+
+    thumbnails = {}
+    widths = sorted({min(width, image.width) for width in THUMBNAIL_WIDTHS})
+    for name in output_formats():
+        pillow_format, options = THUMBNAIL_FORMATS[name]
+        extension = "jpg" if name == "jpeg" else name
+        thumbnails[name] = {
+            str(width): _store(_encode(_resize(image, width), pillow_format, options), f"-{width}w", extension)
+            for width in widths
+        }
+    return original_name, thumbnails
+
+
+def process_candidate_image(candidate, force=False):
+    """ Replace ``candidate``'s uploaded photo with its cleaned, hashed
+    version and record its thumbnails. Returns whether anything changed. """
+    if not candidate.image:
+        if candidate.thumbnails:
+            Candidate.objects.filter(pk=candidate.pk).update(thumbnails={})
+            return True
+        return False
+    if candidate.thumbnails and not force:
+        return False
+
+    uploaded_name = candidate.image.name
+    with candidate.image.open("rb") as source:
+        original_name, thumbnails = render_images(source)
+
+    # A concurrent edit may have replaced the photo meanwhile; only
+    # overwrite the row if it still points at the file just processed.
+    updated = Candidate.objects.filter(pk=candidate.pk, image=uploaded_name).update(
+        image=original_name, thumbnails=thumbnails)
+    if updated and uploaded_name != original_name:
+        default_storage.delete(uploaded_name)
+    candidate.image.name, candidate.thumbnails = original_name, thumbnails
+    return bool(updated)
+
+
+def _process_in_background(candidate_pk):
+    try:
+        candidate = Candidate.objects.filter(pk=candidate_pk).first()
+        if candidate is not None:
+            process_candidate_image(candidate, force=True)
+    except Exception:
+        # The photo stays usable full size; process_candidate_images retries it
+        logger.exception("Could not process the image of candidate %s", candidate_pk)
+    finally:
+        connections.close_all()
+
+
+def schedule_candidate_image(candidate):
+    """ Process ``candidate``'s photo off the request path, once the
+    transaction that saved it has committed """
+    candidate_pk = candidate.pk
+    transaction.on_commit(lambda: _executor.submit(_process_in_background, candidate_pk))
@@ -0,0 +1,249 @@
+""" Validation and de-duplication of voter registers before they are imported.
+
+``prepare_register`` goes over the whole register before anything is
+written:
+
+* emails are trimmed, lower-cased and validated, and reduced to a mailbox
+  key that ignores plus-tags and, for Gmail, dots, so
+  ``Ada.Obi+poll@GMail.com`` and ``adaobi@gmail.com`` are caught as the
+  same person;
+* phone numbers in any common format are parsed to E.164;
+* duplicates within the register and against registered voters are found
+  with dict lookups built from a single query, never a query per row.
+
+It returns a report of every row that was rejected or looks suspicious,
+along with the voters that can be created.
+
+Phone parsing is the expensive part (``phonenumbers.parse`` and
+``is_valid_number`` cost ~25us a number), so it is memoized on the number
+with its formatting stripped: the same number, however it is written, is
+only parsed once.
+"""
+import re
+from functools import lru_cache
+
+import phonenumbers
+from django.conf import settings
+from django.core.validators import EmailValidator
+from django.db.models import CharField
+from django.db.models.functions import Cast, Upper
+from phonenumber_field.phonenumber import PhoneNumber
+
+from voting.models import Voter
+
+EXPECTED_HEADERS = ["email", "first_name", "last_name", "phone_number"]
+
+# Providers that ignore dots in the local part of an address
+DOTLESS_DOMAINS = {"gmail.com": "gmail.com", "googlemail.com": "gmail.com"}
+EMAIL_MAX_LENGTH = Voter._meta.get_field("email").max_length
+NAME_MAX_LENGTH = Voter._meta.get_field("first_name").max_length
+
+_email_validator = EmailValidator()
+# Compiled here: EmailValidator's own is lazy, a proxy hop on every use
+_email_user_regex = re.compile(_email_validator.user_regex.pattern, _email_validator.user_regex.flags)
+_phone_formatting = re.compile(r"[\s\-./()]")
+
+
+class ImportReport:
+    """ Outcome of checking a register.
+
+    ``valid`` holds the cleaned ``(email, first_name, last_name,
+    phone_number)`` of the voters to create, see ``build_voters``;
+    ``rejected`` and ``warnings`` hold ``(line, email, reason)`` tuples,
+    lines counted from the header.
+    """
+
+    def __init__(self, poll_id):
+        self.poll_id = poll_id
+        self.valid = []
+        self.rejected = []
+        self.warnings = []
+        self.rows = 0
+
+    def build_voters(self):
+        """ Unsaved ``Voter``s for ``bulk_create`` """
+        for email, first_name, last_name, phone_number in self.valid:
+            yield Voter(poll_id=self.poll_id, email=email, first_name=first_name,
+                        last_name=last_name, phone_number=phone_number)
+
+    def reject(self, line, email, reason):
+        self.rejected.append((line, email, reason))
+
+    def warn(self, line, email, reason):
+        self.warnings.append((line, email, reason))
+
+
+@lru_cache(maxsize=4096)
+def _valid_domain(domain):
+    return domain in _email_validator.domain_allowlist or _email_validator.validate_domain_part(domain)
+
+
+def normalize_email(email):
+    """ Lower-cased address, or None if it is not a valid email """
+    email = email.strip().lower()
+    if not email or len(email) > EMAIL_MAX_LENGTH:
+        return None
+    local, at, domain = email.rpartition("@")
+    if not at or not _email_user_regex.match(local) or not _valid_domain(domain):
+        return None
+    return email
+
+
+def mailbox_key(email):
+    """ Key under which addresses that reach the same mailbox collide """
+    local, _, domain = email.rpartition("@")
+    local = local.split("+", 1)[0]
+    if domain in DOTLESS_DOMAINS:
+        local, domain = local.replace(".", ""), DOTLESS_DOMAINS[domain]
+    return f"{local}@{domain}"
+
+
+@lru_cache(maxsize=65536)
+def _parse_phone(canonical, region):
+    try:
+        number = PhoneNumber.from_string(canonical, region=region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_valid_number(number):
+        return None
+    return number, phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def parse_phone(raw, region=None):
+    """ ``raw`` as ``(PhoneNumber, E.164 string)``, None if it is not a
+    valid number.
+
+    Formatting characters (spaces, dashes, dots, slashes, brackets) are
+    ignored, so every way of writing a number shares one cache entry.
+    """
+    canonical = _phone_formatting.sub("", raw)
+    if not canonical.isdigit() and not (canonical[:1] == "+" and canonical[1:].isdigit()):
+        # Extensions, letters: only phonenumbers knows what to do
+        canonical = raw.strip()
+    return _parse_phone(canonical, region)
+
+
+class RegisteredVoters:
+    """ Lookups over the voters already registered, as ``prepare_register``
+    checks a register against them. Built once, it serves the registers of
+    several polls; ``add`` the voters accepted from one before checking the
+    next. """
+
+    def __init__(self, registered=()):
+        self.emails = {}  # email -> poll of the voter
+        self.mailboxes = {}  # mailbox key -> email
+        self.phones = {}  # poll -> phone numbers (E.164) of its voters
+        for email, phone_number, poll_id in registered:
+            self.add(email, phone_number, poll_id)
+
+    def add(self, email, phone_number, poll_id):
+        email = email.lower()
+        self.emails[email] = poll_id
+        self.mailboxes.setdefault(mailbox_key(email), email)
+        if phone_number:
+            self.phones.setdefault(poll_id, set()).add(phone_number)
+
+
+def prepare_register(rows, poll_id, registered=(), region=None):
+    """ Check the register ``rows`` (dicts keyed by ``EXPECTED_HEADERS``)
+    for ``poll_id`` against the ``registered`` voters: an iterable of
+    ``(email, phone_number, poll_id)`` such as ``registered_voters`` of the
+    rows, or ``RegisteredVoters`` built from one. """
+    region = region or getattr(settings, "PHONENUMBER_DEFAULT_REGION", None)
+    report = ImportReport(poll_id)
+    if not isinstance(registered, RegisteredVoters):
+        registered = RegisteredVoters(registered)
+    registered_emails = registered.emails
+    registered_mailboxes = registered.mailboxes
+    registered_phones = registered.phones.get(poll_id, ())
+
+    seen_emails = {}
+    seen_mailboxes = {}
+    seen_phones = {}
+    for line, row in enumerate(rows, start=2):
+        report.rows += 1
+        raw_email = (row.get("email") or "").strip()
+        email = normalize_email(raw_email)
+        if email is None:
+            report.reject(line, raw_email, "invalid email address")
+            continue
+        first_name = (row.get("first_name") or "").strip()
+        last_name = (row.get("last_name") or "").strip()
+        if not first_name or not last_name:
+            report.reject(line, email, "first and last name are required")
+            continue
+        if len(first_name) > NAME_MAX_LENGTH or len(last_name) > NAME_MAX_LENGTH:
+            report.reject(line, email, f"names are limited to {NAME_MAX_LENGTH} characters")
+            continue
+
+        if email in seen_emails:
+            report.reject(line, email, f"duplicate of line {seen_emails[email]}")
+            continue
+        if email in registered_emails:
+            where = "this poll" if registered_emails[email] == poll_id else "another poll"
+            report.reject(line, email, f"already registered for {where}")
+            continue
+        key = mailbox_key(email)
+        if key in seen_mailboxes:
+            other_line, other_email = seen_mailboxes[key]
+            report.reject(line, email, f"same mailbox as {other_email} on line {other_line}")
+            continue
+        if key in registered_mailboxes:
+            report.reject(line, email, f"same mailbox as registered voter {registered_mailboxes[key]}")
+            continue
+
+        # Parsed last: the costliest check, wasted on rows rejected anyway
+        raw_phone = (row.get("phone_number") or "").strip()
+        phone = None
+        if raw_phone:
+            phone = parse_phone(raw_phone, region)
+            if phone is None:
+                report.reject(line, email, f"invalid phone number {raw_phone!r}")
+                continue
+
+        if phone is not None:
+            e164 = phone[1]
+            if e164 in seen_phones:
+                report.warn(line, email, f"phone number also on line {seen_phones[e164]}")
+            elif e164 in registered_phones:
+                report.warn(line, email, "phone number already used by a voter of this poll")
+            seen_phones.setdefault(e164, line)
+
+        seen_emails[email] = line
+        seen_mailboxes[key] = (line, email)
+        report.valid.append((email, first_name, last_name, "" if phone is None else phone[0]))
+    return report
+
+
+def registered_voters(emails, poll_ids=(), chunk_size=1000):
+    """ ``(email, phone_number, poll_id)`` of the voters, deleted or not, a
+    register with these ``emails`` could collide with, as
+    ``prepare_register`` expects: those with one of the addresses or one of
+    their mailbox keys, and every voter of ``poll_ids`` for the phone
+    numbers. A registered address only collides on its mailbox when it is
+    stored in that plain form, e.g. not as ``j.doe+news@gmail.com``. """
+    wanted = set()
+    for email in emails:
+        email = normalize_email(email or "")
+        if email is not None:
+            wanted.add(email.upper())
+            wanted.add(mailbox_key(email).upper())
+    voters = (
+        Voter.all_objects
+        # As stored (E.164): loading them as PhoneNumber would parse each one
+        .annotate(phone=Cast("phone_number", output_field=CharField()))
+    )
+    wanted = sorted(wanted)
+    for start in range(0, len(wanted), chunk_size):
+        # Upper() matches the voter_email_upper_idx expression index
+        yield from (
+            voters.annotate(email_upper=Upper("email"))
+            .filter(email_upper__in=wanted[start:start + chunk_size])
+            .values_list("email", "phone", "poll_id")
+        )
+    if poll_ids:
+        yield from (
+            voters.filter(poll_id__in=list(poll_ids))
+            .values_list("email", "phone", "poll_id")
+            .iterator(chunk_size=10000)
+        )
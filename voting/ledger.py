@@ -0,0 +1,214 @@
+""" Tamper-evident vote ledger.
+
+Every cast vote appends a ``LedgerEntry`` to its poll's hash chain::
+
+    entry_hash = sha256(previous_hash | payload)
+
+where the payload covers the vote (voter, candidate, time and, for ranked
+or approval polls, the packed ballot). Every ``CHECKPOINT_SIZE`` entries a
+``LedgerCheckpoint`` stores the Merkle root of the batch and the hash that
+ends it, so batches can be verified independently and in parallel.
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from voting.models import Ballot, LedgerCheckpoint, LedgerEntry, Poll, Vote
+
+CHECKPOINT_SIZE = 1024
+GENESIS_HASH = "0" * 64
+
+
+def vote_payload(poll_id, sequence, vote_id, voter_id, candidate_id, date_created, rankings):
+    return "|".join([
+        str(poll_id), str(sequence), str(vote_id), str(voter_id), str(candidate_id),
+        date_created.isoformat(), bytes(rankings or b"").hex(),
+    ])
+
+
+def chain_hash(previous_hash, payload):
+    return hashlib.sha256(f"{previous_hash}|{payload}".encode()).hexdigest()
+
+
+def merkle_root(hashes):
+    level = [bytes.fromhex(h) for h in hashes]
+    if not level:
+        return GENESIS_HASH
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def lock_poll(poll_id):
+    """ Lock the poll row so entries of one poll are appended one at a time.
+
+    Take it before the vote is inserted, in the same transaction. FOR NO KEY
+    UPDATE (where the database has it) does not conflict with the FOR KEY
+    SHARE locks the foreign key checks of the vote and ballot inserts take
+    on the poll row, so two voters of a poll cannot deadlock on it.
+    """
+    connection = connections[router.db_for_write(Poll)]
+    no_key = connection.features.has_select_for_no_key_update
+    list(Poll.all_objects.select_for_update(no_key=no_key).filter(pk=poll_id).values_list("pk"))
+
+
+def append_vote(vote, rankings=b""):
+    """ Chain ``vote`` onto its poll's ledger.
+
+    Must run in the transaction that saves the vote, see ``lock_poll``.
+    """
+    lock_poll(vote.poll_id)
+    last = (
+        LedgerEntry.objects.filter(poll_id=vote.poll_id)
+        .order_by("-sequence")
+        .values_list("sequence", "entry_hash")
+        .first()
+    )
+    sequence, previous_hash = (last[0] + 1, last[1]) if last else (0, GENESIS_HASH)
+    payload = vote_payload(vote.poll_id, sequence, vote.pk, vote.voted_by_id,
+                           vote.candidate_id, vote.date_created, rankings)
+    entry = LedgerEntry.objects.create(
+        poll_id=vote.poll_id, sequence=sequence, vote_id=vote.pk,
+        previous_hash=previous_hash, entry_hash=chain_hash(previous_hash, payload),
+    )
+
+    if (sequence + 1) % CHECKPOINT_SIZE == 0:
+        first_sequence = sequence + 1 - CHECKPOINT_SIZE
+        hashes = (
+            LedgerEntry.objects.filter(poll_id=vote.poll_id, sequence__gte=first_sequence)
+            .order_by("sequence")
+            .values_list("entry_hash", flat=True)
+        )
+        LedgerCheckpoint.objects.create(
+            poll_id=vote.poll_id, index=sequence // CHECKPOINT_SIZE,
+            first_sequence=first_sequence, last_sequence=sequence,
+            merkle_root=merkle_root(list(hashes)), chain_hash=entry.entry_hash,
+        )
+    return entry
+
+
+def backfill(poll):
+    """ Append ledger entries for ``poll``'s votes that predate the ledger """
+    recorded = LedgerEntry.objects.filter(poll=poll).values_list("vote_id", flat=True)
+    missing = Vote._base_manager.filter(poll=poll).exclude(pk__in=recorded).order_by("pk")
+    rankings = dict(Ballot.objects.filter(poll=poll).values_list("vote_id", "rankings"))
+    count = 0
+    for vote in missing.iterator():
+        with transaction.atomic():
+            append_vote(vote, rankings.get(vote.pk, b""))
+        count += 1
+    return count
+
+
+def verify_range(poll_id, first_sequence, last_sequence, previous_hash, expected_root=None):
+    """ Re-derive the chain between two sequence numbers (inclusive,
+    ``last_sequence`` None for the end of the ledger).
+
+    Returns ``(entries checked, first bad sequence or None, reason)``.
+    """
+    entries = LedgerEntry.objects.filter(poll_id=poll_id, sequence__gte=first_sequence)
+    if last_sequence is not None:
+        entries = entries.filter(sequence__lte=last_sequence)
+    entries = list(
+        entries.order_by("sequence").values_list("sequence", "vote_id", "previous_hash", "entry_hash")
+    )
+    vote_ids = [entry[1] for entry in entries]
+    votes = {
+        vote_id: rest for vote_id, *rest in
+        Vote._base_manager.filter(pk__in=vote_ids)
+        .values_list("pk", "poll_id", "voted_by_id", "candidate_id", "date_created")
+    }
+    rankings = dict(Ballot.objects.filter(vote_id__in=vote_ids).values_list("vote_id", "rankings"))
+
+    expected_sequence = first_sequence
+    for sequence, vote_id, entry_previous, entry_hash in entries:
+        if sequence != expected_sequence:
+            return len(entries), expected_sequence, "entry missing"
+        if entry_previous != previous_hash:
+            return len(entries), sequence, "chain broken"
+        if vote_id not in votes:
+            return len(entries), sequence, f"vote {vote_id} deleted"
+        vote_poll, voter_id, candidate_id, date_created = votes[vote_id]
+        if vote_poll != poll_id:
+            return len(entries), sequence, f"vote {vote_id} moved to another poll"
+        payload = vote_payload(poll_id, sequence, vote_id, voter_id, candidate_id,
+                               date_created, rankings.get(vote_id))
+        if chain_hash(previous_hash, payload) != entry_hash:
+            return len(entries), sequence, f"vote {vote_id} or its entry was altered"
+        previous_hash = entry_hash
+        expected_sequence += 1
+
+    if last_sequence is not None and expected_sequence <= last_sequence:
+        return len(entries), expected_sequence, "entry missing"
+    if expected_root is not None and merkle_root([entry[3] for entry in entries]) != expected_root:
+        return len(entries), first_sequence, "checkpoint root mismatch"
+    return len(entries), None, ""
+
+
+def _init_worker():
+    django.setup()
+
+
+def _verify_checkpoint(args):
+    try:
+        return verify_range(*args)
+    finally:
+        connections.close_all()
+
+
+def verify_poll(poll, full=True, processes=1):
+    """ Verify ``poll``'s ledger.
+
+    Every batch is re-hashed from the vote rows, so a vote changed after its
+    batch was last verified is found. ``full=False`` skips, and trusts,
+    the batches verified before.
+    Returns ``(entries checked, first bad sequence or None, reason)``.
+    """
+    checkpoints = list(LedgerCheckpoint.objects.filter(poll=poll).order_by("index"))
+    jobs = []
+    previous_hash = GENESIS_HASH
+    for checkpoint in checkpoints:
+        if full or checkpoint.verified_at is None:
+            jobs.append((checkpoint, (poll.pk, checkpoint.first_sequence, checkpoint.last_sequence,
+                                      previous_hash, checkpoint.merkle_root)))
+        previous_hash = checkpoint.chain_hash
+
+    if processes > 1 and len(jobs) > 1:
+        # Forked workers must not share this process's connections
+        connections.close_all()
+        with ProcessPoolExecutor(processes, initializer=_init_worker) as pool:
+            results = list(pool.map(_verify_checkpoint, [job for _, job in jobs]))
+    else:
+        results = [verify_range(*job) for _, job in jobs]
+
+    checked = 0
+    failures = []
+    verified = []
+    for (checkpoint, _), (count, bad_sequence, reason) in zip(jobs, results):
+        checked += count
+        if bad_sequence is None:
+            verified.append(checkpoint.pk)
+        else:
+            failures.append((bad_sequence, reason))
+
+    # Entries after the last checkpoint only have the chain to check
+    tail_start = checkpoints[-1].last_sequence + 1 if checkpoints else 0
+    count, bad_sequence, reason = verify_range(poll.pk, tail_start, None, previous_hash)
+    checked += count
+    if bad_sequence is not None:
+        failures.append((bad_sequence, reason))
+
+    recorded = LedgerEntry.objects.filter(poll=poll).count()
+    unrecorded = Vote._base_manager.filter(poll=poll).count() - recorded
+    if unrecorded > 0 and not failures:
+        failures.append((recorded, f"{unrecorded} vote(s) missing from the ledger"))
+
+    LedgerCheckpoint.objects.filter(pk__in=verified).update(verified_at=timezone.now())
+    if failures:
+        return (checked, *min(failures))
+    return checked, None, ""
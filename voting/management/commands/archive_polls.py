@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from voting.archive import archive_poll
+from voting.models import Poll
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the votes and voters of polls closed for more than --days days "
+        "into gzip'd JSONL files in ARCHIVE_STORAGE, keeping a results snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30,
+                            help="Archive polls not updated for this many days (default: 30).")
+        parser.add_argument("--poll", type=int, action="append", dest="polls",
+                            help="Archive only this poll id (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=2000,
+                            help="Rows exported and deleted per batch (default: 2000).")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="List the polls that would be archived.")
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive")
+
+        # Polls only carry a time of day, so a poll counts as closed once it
+        # has not been touched for --days and is outside its voting window.
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        # Restored polls can be archived again, interrupted runs are resumed
+        unarchived = (Q(archive__isnull=True) | Q(archive__restored_at__isnull=False)
+                      | Q(archive__completed_at__isnull=True))
+        polls = Poll.all_objects.filter(unarchived, last_updated__lt=cutoff)
+        if options["polls"]:
+            polls = Poll.all_objects.filter(unarchived, pk__in=options["polls"])
+
+        for poll in polls.order_by("pk"):
+            if poll.is_active:
+                self.stdout.write(f"Skipping {poll}: poll is active")
+                continue
+            if options["dry_run"]:
+                self.stdout.write(f"Would archive {poll} (id={poll.pk})")
+                continue
+            try:
+                archive = archive_poll(poll, chunk_size=options["batch_size"])
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not archive {poll}: {e}")
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {poll}: {archive.voter_count} voters, "
+                f"{archive.vote_count} votes -> {archive.location}"
+            ))
@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from voting.counting import ballot_matrix, count_approval, count_stv, pack_rankings
+
+
+class Command(BaseCommand):
+    help = "Benchmark the ranked-choice and approval counting engines on synthetic ballots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ballots", type=int, default=1_000_000)
+        parser.add_argument("--candidates", type=int, default=8)
+        parser.add_argument("--seats", type=int, default=3, help="Seats for the STV run.")
+        parser.add_argument("--seed", type=int, default=2023)
+
+    def timed(self, label, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label:<28} {elapsed:8.3f}s")
+        return result
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        ballots, candidates = options["ballots"], options["candidates"]
+        candidate_ids = list(range(1, candidates + 1))
+
+        # Skewed preferences with ballots of varying length, like real polls
+        popularity = rng.dirichlet(np.ones(candidates) * 2)
+        lengths = rng.integers(1, candidates + 1, size=ballots)
+        self.stdout.write(f"{ballots} ballots, {candidates} candidates")
+
+        def make_packed():
+            orders = np.argsort(-rng.gumbel(size=(ballots, candidates)) - np.log(popularity), axis=1)
+            ids = orders.astype(np.uint32) + 1
+            return [pack_rankings(row[:length]) for row, length in zip(ids, lengths)]
+
+        packed = self.timed("generate + pack", make_packed)
+        matrix = self.timed("load ballot matrix", ballot_matrix, packed, candidate_ids)
+
+        irv = self.timed("IRV", count_stv, matrix, candidates, 1)
+        stv = self.timed(f"STV ({options['seats']} seats)", count_stv, matrix, candidates, options["seats"])
+        approval = self.timed("approval", count_approval, matrix, candidates, options["seats"])
+
+        self.stdout.write(f"IRV elected {irv['elected']} in {len(irv['rounds'])} rounds")
+        self.stdout.write(f"STV elected {stv['elected']} in {len(stv['rounds'])} rounds")
+        self.stdout.write(f"Approval elected {approval['elected']}")
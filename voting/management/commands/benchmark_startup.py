@@ -0,0 +1,53 @@
+import json
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Runs in a fresh interpreter so imports and template compilation are cold
+PROBE = """
+import json, os, time
+start = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "e_voting.settings")
+from e_voting.wsgi import application
+loaded = time.perf_counter()
+if {warm}:
+    from e_voting.warmup import warm_up
+    warm_up()
+warmed = time.perf_counter()
+from django.test import Client
+Client().get({path!r})
+served = time.perf_counter()
+print(json.dumps({{"load": loaded - start, "warm_up": warmed - loaded, "first_request": served - warmed}}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure web process startup: loading the WSGI app, the warm-up run by "
+        "gunicorn before accepting traffic, and the first request with and without it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--path", default="/", help="URL of the first request (default: /).")
+
+    def probe(self, warm, path):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(warm=warm, path=path)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for warm in (False, True):
+            samples = [self.probe(warm, options["path"]) for _ in range(options["runs"])]
+            self.stdout.write("with warm-up:" if warm else "without warm-up:")
+            for key in ("load", "warm_up", "first_request"):
+                values = [sample[key] * 1000 for sample in samples]
+                self.stdout.write(
+                    f"  {key:<14} median {statistics.median(values):8.1f} ms"
+                    f"   max {max(values):8.1f} ms"
+                )
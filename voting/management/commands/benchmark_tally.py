@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from voting import tally
+
+
+def cast(poll_id, candidates, votes, seed, start, results):
+    """ One simulated worker: count ``votes`` random votes and report how
+    many went to each candidate """
+    rng = random.Random(seed)
+    cast = dict.fromkeys(candidates, 0)
+    start.wait()
+    for _ in range(votes):
+        candidate_id = rng.choice(candidates)
+        tally.record_vote(poll_id, candidate_id)
+        cast[candidate_id] += 1
+    results.put(cast)
+
+
+class Command(BaseCommand):
+    help = (
+        "Count votes into a throwaway live tally from several processes at once, "
+        "check no vote is lost and time increments and reads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--votes", type=int, default=50_000, help="Votes per process and round.")
+        parser.add_argument("--candidates", type=int, default=10)
+        parser.add_argument("--rounds", type=int, default=2,
+                            help="Later rounds run in new processes, reusing the stripes of the exited ones.")
+
+    def run_round(self, context, poll_id, candidates, options, round_number):
+        start, results = context.Event(), context.Queue()
+        processes = [
+            context.Process(target=cast, args=(
+                poll_id, candidates, options["votes"], round_number * 1000 + i, start, results))
+            for i in range(options["processes"])
+        ]
+        for process in processes:
+            process.start()
+        time.sleep(0.5)  # let every process reach the start line
+        began = time.perf_counter()
+        start.set()
+        counts = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - began
+        for process in processes:
+            process.join()
+        return counts, elapsed
+
+    def handle(self, *args, **options):
+        if not tally.enabled():
+            raise CommandError("Live tallies are disabled (LIVE_TALLY=0 or no fcntl on this platform).")
+        if options["processes"] > settings.TALLY_STRIPES:
+            self.stderr.write("More processes than TALLY_STRIPES: the rest count under the segment lock.")
+
+        # No poll has a negative id, so the tally starts empty
+        poll_id = -os.getpid()
+        candidates = list(range(1, options["candidates"] + 1))
+        context = multiprocessing.get_context("fork")
+        expected = dict.fromkeys(candidates, 0)
+        try:
+            segment = tally.get_tally(poll_id, create=True)
+            # Forked processes must not share this process's connections
+            connections.close_all()
+            for round_number in range(options["rounds"]):
+                counts, elapsed = self.run_round(context, poll_id, candidates, options, round_number)
+                for cast_counts in counts:
+                    for candidate_id, votes in cast_counts.items():
+                        expected[candidate_id] += votes
+                total = options["processes"] * options["votes"]
+                self.stdout.write(
+                    f"round {round_number + 1}: {total:,} votes from {options['processes']} processes "
+                    f"in {elapsed:.2f} s ({total / elapsed:,.0f} votes/s)"
+                )
+
+            totals = segment.totals()
+            lost = sum(expected.values()) - sum(totals.values())
+            mismatched = [pk for pk in candidates if totals.get(pk, 0) != expected[pk]]
+            owners = sum(1 for owner in segment.owners if owner)
+            self.stdout.write(
+                f"tally {sum(totals.values()):,} of {sum(expected.values()):,} votes cast; "
+                f"{lost} lost, {len(mismatched)} candidate(s) off; {owners} stripe(s) used"
+            )
+
+            reads = 10_000
+            began = time.perf_counter()
+            for _ in range(reads):
+                segment.totals()
+            self.stdout.write(f"read: {(time.perf_counter() - began) / reads * 1e6:.1f} us per tally")
+            if lost or mismatched:
+                raise CommandError("The live tally lost or misplaced votes")
+        finally:
+            tally.drop(poll_id)
@@ -0,0 +1,63 @@
+import datetime
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.utils import timezone
+
+from voting.models import Candidate, Poll, Voter
+
+
+class Command(BaseCommand):
+    help = "Measure the render time of the ballot page (vote_form.html) per request."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=1000)
+        parser.add_argument("--candidates", type=int, default=8)
+        parser.add_argument("--template", default="voting/vote_form.html")
+
+    def context(self, candidates):
+        # Unsaved objects, so only template work is measured
+        poll = Poll(id=1, name="Benchmark poll", description="Render benchmark",
+                    start_time=datetime.time(0, 0), end_time=datetime.time(23, 59))
+        return {
+            "poll": poll,
+            "voter": Voter(first_name="Ada", last_name="Obi", email="ada@example.com", poll=poll),
+            "candidates": [Candidate(id=i, name=f"Candidate {i}", poll=poll) for i in range(1, candidates + 1)],
+            "now": timezone.localtime().time(),
+        }
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get("/polls/1/voters/ballot/vote")
+        request.user = AnonymousUser()
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        context = self.context(options["candidates"])
+
+        start = time.perf_counter()
+        template = get_template(options["template"])
+        first = time.perf_counter() - start
+
+        timings = []
+        for _ in range(options["renders"]):
+            start = time.perf_counter()
+            template.render(context, request)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        loaders = settings.TEMPLATES[0]["OPTIONS"].get("loaders", [])
+        self.stdout.write(f"profile: {settings.DJANGO_ENV} (DEBUG={settings.DEBUG}), loaders: {loaders}")
+        self.stdout.write(f"load + compile {options['template']}: {first * 1000:.2f} ms")
+        self.stdout.write(
+            f"render x{options['renders']}: mean {statistics.mean(timings):.3f} ms, "
+            f"p50 {timings[len(timings) // 2]:.3f} ms, p95 {timings[int(len(timings) * 0.95)]:.3f} ms"
+        )
+        start = time.perf_counter()
+        for _ in range(100):
+            get_template(options["template"])
+        self.stdout.write(f"get_template (cached) x100: {(time.perf_counter() - start) * 1000:.2f} ms")
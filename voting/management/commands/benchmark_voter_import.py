@@ -0,0 +1,101 @@
+import random
+import time
+
+import phonenumbers
+from django.core.management.base import BaseCommand
+from phonenumber_field.phonenumber import PhoneNumber
+
+from voting import importing
+
+PHONE_FORMATS = ["+234 {a} {b} {c}", "+234{a}{b}{c}", "0{a}-{b}-{c}", "(0{a}) {b} {c}", "234{a}{b}{c}"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the validation and de-duplication of a synthetic voter register "
+        "(mixed-case emails, plus-tags, phone numbers in mixed formats)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--registered", type=int, default=100_000,
+                            help="Voters already in the database, simulated in memory.")
+        parser.add_argument("--duplicates", type=float, default=0.05,
+                            help="Share of rows repeating an earlier voter in another form.")
+        parser.add_argument("--region", default="NG")
+        parser.add_argument("--check", type=int, default=20_000,
+                            help="Rows whose phone number is also checked with phonenumbers itself.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def phone(self, rng):
+        a, b, c = rng.choice(["803", "806", "813", "703", "706", "903", "810"]), rng.randint(100, 999), rng.randint(1000, 9999)
+        if rng.random() < 0.01:
+            c = rng.randint(10, 99)  # too short
+        return rng.choice(PHONE_FORMATS).format(a=a, b=b, c=c)
+
+    def register(self, rows, duplicates, rng):
+        register = []
+        for i in range(rows):
+            if register and rng.random() < duplicates:
+                row = dict(rng.choice(register))
+                local, _, domain = row["email"].partition("@")
+                row["email"] = rng.choice([
+                    row["email"].upper(), f"{local}+poll@{domain}", f" {row['email']} ", row["email"],
+                ])
+            else:
+                row = {
+                    "email": f"Voter.{i}@{rng.choice(['gmail.com', 'yahoo.com', 'example.org', 'mail.ng'])}",
+                    "first_name": "Ada", "last_name": f"Obi{i}", "phone_number": self.phone(rng),
+                }
+            register.append(row)
+        return register
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        rows = self.register(options["rows"], options["duplicates"], rng)
+        registered = [
+            (f"registered.{i}@example.org", "", 1) for i in range(options["registered"])
+        ]
+        rows.extend({"email": email.upper(), "first_name": "Re", "last_name": "Registered",
+                     "phone_number": ""} for email, _, _ in registered[:1000])
+
+        start = time.perf_counter()
+        report = importing.prepare_register(rows, 2, registered, region=options["region"])
+        elapsed = time.perf_counter() - start
+
+        reasons = {}
+        for _, _, reason in report.rejected:
+            # Drop the specifics ("duplicate of line 12" -> "duplicate of")
+            reason = " ".join(word for word in reason.split()[:3] if not any(c.isdigit() or c == "@" for c in word))
+            reasons[reason] = reasons.get(reason, 0) + 1
+        self.stdout.write(
+            f"{report.rows:,} rows against {len(registered):,} registered voters: {elapsed:.2f} s "
+            f"({elapsed / max(report.rows, 1) * 1e6:.2f} us/row)"
+        )
+        self.stdout.write(f"valid {len(report.valid):,}, rejected {len(report.rejected):,}, "
+                          f"warnings {len(report.warnings):,}")
+        for reason, count in sorted(reasons.items(), key=lambda item: -item[1]):
+            self.stdout.write(f"  {count:>9,}  {reason}")
+        self.stdout.write(f"phone cache: {importing._parse_phone.cache_info()}")
+
+        # Same numbers through phonenumbers without the cache, for
+        # comparison and to confirm stripping the formatting changes nothing
+        sample = [row["phone_number"] for row in rows[:options["check"]] if row["phone_number"]]
+        start = time.perf_counter()
+        expected = []
+        for raw in sample:
+            try:
+                number = PhoneNumber.from_string(raw, region=options["region"])
+                expected.append(number.as_e164 if number.is_valid() else None)
+            except phonenumbers.NumberParseException:
+                expected.append(None)
+        reference = (time.perf_counter() - start) / max(len(sample), 1)
+        mismatches = 0
+        for raw, e164 in zip(sample, expected):
+            phone = importing.parse_phone(raw, options["region"])
+            mismatches += (phone[1] if phone is not None else None) != e164
+        self.stdout.write(
+            f"phonenumbers parse + is_valid: {reference * 1e6:.2f} us/number "
+            f"(~{reference * report.rows:.1f} s for every row); "
+            f"{mismatches} disagreement(s) in {len(sample):,} numbers"
+        )
@@ -0,0 +1,111 @@
+import datetime
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from voting.middleware import brotli
+from voting.models import Candidate, Poll, Voter, normalize_receipt_code
+from voting.views import ReceiptLookupView
+
+STATIC_REFERENCE = re.compile(r'(?:href|src)="(/?%s[^"]+)"' % re.escape(settings.STATIC_URL.strip("/")))
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the bytes one voter session puts on the wire (ballot, vote, "
+        "success page, receipt lookup, results) per Accept-Encoding."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--candidates", type=int, default=8)
+
+    def response_bytes(self, response):
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        headers = sum(len(name) + len(value) + 4 for name, value in response.items())
+        return len(body) + headers
+
+    def session(self, poll, candidate, voter, encoding):
+        """ Bytes per step of one voter going through the ballot path """
+        client = Client(HTTP_ACCEPT_ENCODING=encoding)
+        ballot_url = reverse("voting:vote", kwargs={"pk": poll.pk, "voter_pk": voter.pk})
+        steps = {}
+
+        response = client.get(ballot_url)
+        steps["ballot"] = self.response_bytes(response)
+        html = response.content
+        if response.get("Content-Encoding") == "gzip":
+            html = gzip.decompress(html)
+        elif response.get("Content-Encoding") == "br":
+            html = brotli.decompress(html)
+
+        response = client.post(ballot_url, {"candidate": candidate.pk})
+        steps["vote"] = self.response_bytes(response)
+        success_url = response["Location"]
+        steps["success"] = self.response_bytes(client.get(success_url))
+        receipt = success_url.partition("receipt=")[2]
+        steps["receipt"] = self.response_bytes(client.get(reverse("voting:receipt", args=[receipt])))
+        # The vote is rolled back, its cached receipt must not outlive it
+        cache.delete(f"{ReceiptLookupView.cache_prefix}:{normalize_receipt_code(receipt)}")
+        steps["results"] = self.response_bytes(client.get(reverse("voting:poll-result", args=[poll.pk])))
+        return steps, html.decode()
+
+    def static_bytes(self, html):
+        """ Size of the local static files the ballot references, as
+        stored and as WhiteNoise serves them precompressed """
+        raw = gzipped = brotlied = 0
+        for url in set(STATIC_REFERENCE.findall(html)):
+            path = finders.find(url.lstrip("/")[len(settings.STATIC_URL.strip("/")) + 1:])
+            if not path:
+                continue
+            with open(path, "rb") as fh:
+                data = fh.read()
+            raw += len(data)
+            gzipped += len(gzip.compress(data, 9))
+            brotlied += len(brotli.compress(data)) if brotli else len(gzip.compress(data, 9))
+        return raw, gzipped, brotlied
+
+    def handle(self, *args, **options):
+        encodings = ["identity", "gzip"] + (["br"] if brotli else [])
+        results = {}
+        html = ""
+        try:
+            # Throwaway poll, rolled back at the end
+            with transaction.atomic():
+                poll = Poll.objects.create(
+                    name="Wire benchmark poll", description="Bytes on the wire per voter session",
+                    start_time=datetime.time(0, 0), end_time=datetime.time(23, 59, 59))
+                candidates = [
+                    Candidate.objects.create(name=f"Wire benchmark candidate {i}", poll=poll)
+                    for i in range(options["candidates"])
+                ]
+                for encoding in encodings:
+                    voter = Voter.objects.create(
+                        poll=poll, email=f"wire-{encoding}@example.com", first_name="Ada", last_name="Obi")
+                    results[encoding], html = self.session(poll, candidates[0], voter, encoding)
+                raise Rollback
+        except Rollback:
+            pass
+
+        steps = list(results[encodings[0]])
+        self.stdout.write("step".ljust(10) + "".join(encoding.rjust(12) for encoding in encodings))
+        for step in steps + ["total"]:
+            row = [sum(results[e].values()) if step == "total" else results[e][step] for e in encodings]
+            self.stdout.write(step.ljust(10) + "".join(f"{value:>12,}" for value in row))
+
+        raw, gzipped, brotlied = self.static_bytes(html)
+        self.stdout.write(
+            f"\nlocal static files on the ballot (first visit only): {raw:,} raw, "
+            f"{gzipped:,} gzip, {brotlied:,} {'brotli' if brotli else 'gzip'}"
+        )
+        self.stdout.write("Headers are counted approximately; CDN-hosted assets are not included.")
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from voting.images import process_candidate_image
+from voting.models import Candidate
+
+
+class Command(BaseCommand):
+    help = (
+        "Strip metadata from candidate photos and render their thumbnails. "
+        "Only photos not processed yet, unless --force."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=int, action="append", dest="polls",
+                            help="Process only the candidates of this poll id (repeatable).")
+        parser.add_argument("--force", action="store_true",
+                            help="Re-render photos that already have thumbnails.")
+
+    def handle(self, *args, **options):
+        candidates = Candidate.objects.exclude(image="").exclude(image__isnull=True)
+        if options["polls"]:
+            candidates = candidates.filter(poll_id__in=options["polls"])
+
+        processed = failed = 0
+        for candidate in candidates.order_by("pk").iterator():
+            try:
+                if process_candidate_image(candidate, force=options["force"]):
+                    processed += 1
+            except (OSError, ValueError) as e:
+                # Missing file or not an image Pillow can read
+                failed += 1
+                self.stderr.write(f"{candidate} ({candidate.image.name}): {e}")
+        self.stdout.write(f"Processed {processed} photo(s), {failed} failed.")
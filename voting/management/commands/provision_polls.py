@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from voting import provisioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Create many polls with their candidates and voters from a JSON (or, with "
+        "PyYAML, YAML) manifest, in a few bulk statements. See voting/provisioning.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest")
+        parser.add_argument("--region", help="Region for phone numbers without a country code.")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Check the manifest and report, without creating anything.")
+        parser.add_argument("--strict", action="store_true",
+                            help="Create nothing if any voter row is rejected.")
+        parser.add_argument("--show", type=int, default=20,
+                            help="Rejected voter rows listed per poll (default: 20).")
+
+    def handle(self, *args, **options):
+        try:
+            manifest = provisioning.load_manifest(options["manifest"])
+            prepared = provisioning.prepare(
+                manifest, base_dir=Path(options["manifest"]).parent, region=options["region"])
+        except provisioning.ManifestError as e:
+            raise CommandError("\n".join(["Invalid manifest:"] + e.errors))
+        except (OSError, ValueError) as e:
+            # Missing file, malformed JSON/YAML or voters CSV
+            raise CommandError(f"Cannot read the manifest: {e}")
+
+        rejected = 0
+        for poll, report in zip(prepared.polls, prepared.reports):
+            rejected += len(report.rejected)
+            for line, email, reason in report.rejected[:options["show"]]:
+                self.stderr.write(f"{poll.name}: voter line {line} ({email}): {reason}")
+            if len(report.rejected) > options["show"]:
+                self.stderr.write(f"{poll.name}: {len(report.rejected) - options['show']} more rejected")
+
+        summary = (f"{len(prepared.polls)} poll(s), {len(prepared.candidates)} candidate(s), "
+                   f"{prepared.voter_count} voter(s); {rejected} voter row(s) rejected")
+        if options["dry_run"]:
+            self.stdout.write(f"Would create {summary}")
+            return
+        if rejected and options["strict"]:
+            raise CommandError(f"Nothing created: {rejected} voter row(s) rejected")
+        try:
+            prepared.create()
+        except IntegrityError as e:
+            raise CommandError(f"Nothing created, a row was added meanwhile: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Created {summary}"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import tally
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile the shared-memory live tallies of open polls with the Vote table, "
+        "or rebuild them from it (--rebuild), and remove those of closed polls."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=int, action="append", dest="polls",
+                            help="Only this poll id (repeatable).")
+        parser.add_argument("--rebuild", action="store_true",
+                            help="Recreate the segments from the database instead of adjusting them.")
+
+    def handle(self, *args, **options):
+        if not tally.enabled():
+            raise CommandError("Live tallies are disabled (LIVE_TALLY=0 or no fcntl on this platform).")
+
+        if options["rebuild"] and not options["polls"]:
+            count = tally.rebuild_all()
+            self.stdout.write(f"Rebuilt {count} live tallies")
+            return
+
+        # Only open polls have segments; those of the others are removed
+        open_ids = tally.open_poll_ids()
+        for poll_id in options["polls"] or open_ids:
+            if poll_id not in open_ids:
+                tally.drop(poll_id)
+                self.stdout.write(f"Poll {poll_id} is not open; its votes are counted from the database")
+                continue
+            if options["rebuild"]:
+                tally.drop(poll_id)
+                tally.get_tally(poll_id, create=True)
+                self.stdout.write(f"Rebuilt the tally of poll {poll_id}")
+                continue
+            drift = tally.get_tally(poll_id, create=True).reconcile()
+            if drift:
+                changes = ", ".join(f"candidate {pk}: {votes:+d}" for pk, votes in sorted(drift.items()))
+                self.stdout.write(f"Poll {poll_id} was off ({changes}); corrected")
+            else:
+                self.stdout.write(f"Poll {poll_id} in line with the database")
+        if not options["polls"]:
+            tally.drop_closed(keep=open_ids)
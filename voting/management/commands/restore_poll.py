@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from voting.archive import restore_poll
+from voting.models import Poll, PollArchive
+
+
+class Command(BaseCommand):
+    help = "Reload the archived votes and voters of a poll into the live tables for audit."
+
+    def add_arguments(self, parser):
+        parser.add_argument("poll", type=int, help="Id of the archived poll.")
+        parser.add_argument("--batch-size", type=int, default=2000,
+                            help="Rows inserted per batch (default: 2000).")
+
+    def handle(self, *args, **options):
+        try:
+            poll = Poll.all_objects.get(pk=options["poll"])
+            archive = poll.archive
+        except Poll.DoesNotExist:
+            raise CommandError(f"Poll {options['poll']} does not exist")
+        except PollArchive.DoesNotExist:
+            raise CommandError(f"Poll {poll} has not been archived")
+
+        if archive.is_restored:
+            raise CommandError(f"Poll {poll} was already restored on {archive.restored_at}")
+
+        try:
+            restore_poll(poll, batch_size=options["batch_size"])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not restore {poll}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {poll}: {archive.voter_count} voters, {archive.vote_count} votes"
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from voting.models import Poll, TurnoutBucket
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-minute turnout buckets of polls from the Vote table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--poll", type=int, action="append", dest="polls",
+                            help="Roll up only this poll id (repeatable).")
+
+    def handle(self, *args, **options):
+        # Archived polls no longer have their votes in the live tables
+        polls = Poll.objects.filter(archive__isnull=True)
+        if options["polls"]:
+            polls = polls.filter(pk__in=options["polls"])
+
+        for poll in polls.order_by("pk"):
+            TurnoutBucket.rebuild(poll)
+            self.stdout.write(f"Rolled up turnout for {poll}")
@@ -0,0 +1,51 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voting import ledger
+from voting.models import Poll, PollArchive
+
+
+class Command(BaseCommand):
+    help = (
+        "Verify the hash-chained vote ledger of a poll against its vote rows. "
+        "--skip-verified trusts checkpointed batches verified before."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("poll", type=int, help="Id of the poll to verify.")
+        parser.add_argument("--skip-verified", action="store_true",
+                            help="Skip checkpointed batches verified before; faster, but misses "
+                                 "votes changed since.")
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1,
+                            help="Worker processes for checkpointed batches (default: CPU count).")
+        parser.add_argument("--backfill", action="store_true",
+                            help="First append ledger entries for votes cast before the ledger existed.")
+
+    def handle(self, *args, **options):
+        try:
+            poll = Poll.all_objects.get(pk=options["poll"])
+        except Poll.DoesNotExist:
+            raise CommandError(f"Poll {options['poll']} does not exist")
+        try:
+            if not poll.archive.is_restored:
+                raise CommandError(f"Poll {poll} is archived; restore it before verifying")
+        except PollArchive.DoesNotExist:
+            pass
+
+        if options["backfill"]:
+            self.stdout.write(f"Backfilled {ledger.backfill(poll)} ledger entries")
+
+        start = time.perf_counter()
+        checked, bad_sequence, reason = ledger.verify_poll(
+            poll, full=not options["skip_verified"], processes=options["processes"])
+        elapsed = time.perf_counter() - start
+
+        self.stdout.write(
+            f"Checked {checked} entries in {elapsed:.2f}s "
+            f"({checked / elapsed if elapsed else 0:,.0f} entries/s)"
+        )
+        if bad_sequence is not None:
+            raise CommandError(f"Ledger of {poll} is inconsistent at entry {bad_sequence}: {reason}")
+        self.stdout.write(self.style.SUCCESS(f"Ledger of {poll} is consistent"))
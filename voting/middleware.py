@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.gzip import GZipMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.cache import has_vary_header, patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # optional: responses are then only gzipped
+    brotli = None
+
+
+class VoterSessionMiddleware(SessionMiddleware):
+    """ SessionMiddleware that keeps voter pages off the session store.
+
+    Views named in ``settings.SESSIONLESS_VIEWS`` get an empty session that
+    is never loaded or saved, so ballot traffic does no session reads or
+    writes and sets no session cookie.
+    """
+
+    def is_sessionless(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        return match.view_name in settings.SESSIONLESS_VIEWS
+
+    def process_request(self, request):
+        request.sessionless = self.is_sessionless(request)
+        if request.sessionless:
+            request.session = self.SessionStore()
+        else:
+            super().process_request(request)
+
+    def process_response(self, request, response):
+        if getattr(request, "sessionless", False):
+            return response
+        return super().process_response(request, response)
+
+
+def accepted_encodings(request):
+    """ Content codings the client accepts, without those it refuses (q=0) """
+    encodings = set()
+    for item in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip().partition("q=")[2]
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """ Compress HTML, JSON and other text responses.
+
+    Only content types in ``settings.COMPRESSIBLE_CONTENT_TYPES`` and bodies
+    of at least ``settings.COMPRESSION_MIN_SIZE`` bytes are compressed.
+    Brotli is used when the client accepts it and the ``brotli`` package is
+    installed, gzip otherwise (and for streaming responses). Static files
+    never get here: WhiteNoise serves its precompressed copies first.
+
+    Against BREACH, gzip pads every response with random bytes, as
+    ``GZipMiddleware`` does. Brotli has no field to pad, so responses that
+    may carry a secret keep to gzip: Django marks them ``Vary: Cookie`` when
+    a CSRF token or the session went into them.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get("Content-Type", "").partition(";")[0].strip()
+        if content_type not in settings.COMPRESSIBLE_CONTENT_TYPES:
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        if (response.streaming or brotli is None or "br" not in accepted_encodings(request)
+                or has_vary_header(response, "Cookie")):
+            return super().process_response(request, response)
+        if response.has_header("Content-Encoding"):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(response.content))
+        # The body changed, so a strong ETag no longer applies (as GZipMiddleware)
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PollArchive",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("location", models.CharField(max_length=500)),
+                ("voter_count", models.PositiveIntegerField(default=0)),
+                ("vote_count", models.PositiveIntegerField(default=0)),
+                ("results", models.JSONField(default=dict)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("restored_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "poll",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archive",
+                        to="voting.poll",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:24
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncMinute
+import django.db.models.deletion
+
+
+def backfill_buckets(apps, schema_editor):
+    Vote = apps.get_model("voting", "Vote")
+    TurnoutBucket = apps.get_model("voting", "TurnoutBucket")
+    counts = (
+        Vote.objects.annotate(bucket=TruncMinute("date_created"))
+        .values_list("poll_id", "bucket")
+        .annotate(total=Count("id"))
+        .order_by()
+    )
+    TurnoutBucket.objects.bulk_create(
+        (
+            TurnoutBucket(poll_id=poll_id, minute=minute, count=total)
+            for poll_id, minute, total in counts.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0002_poll_archive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TurnoutBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("minute", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "poll",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="turnout_buckets",
+                        to="voting.poll",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["minute"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="turnoutbucket",
+            constraint=models.UniqueConstraint(
+                fields=("poll", "minute"), name="unique_poll_minute"
+            ),
+        ),
+        migrations.RunPython(backfill_buckets, migrations.RunPython.noop),
+    ]
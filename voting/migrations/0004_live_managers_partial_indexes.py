@@ -0,0 +1,29 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0003_turnout_bucket"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="poll",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["start_time", "end_time"],
+                name="poll_live_window_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voter",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["poll", "is_voted"],
+                name="voter_live_poll_idx",
+            ),
+        ),
+    ]
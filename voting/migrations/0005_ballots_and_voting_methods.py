@@ -0,0 +1,65 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:29
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0004_live_managers_partial_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="poll",
+            name="seats",
+            field=models.PositiveSmallIntegerField(
+                default=1, validators=[django.core.validators.MinValueValidator(1)]
+            ),
+        ),
+        migrations.AddField(
+            model_name="poll",
+            name="voting_method",
+            field=models.CharField(
+                choices=[
+                    ("plurality", "Plurality (one choice)"),
+                    ("irv", "Instant runoff (ranked)"),
+                    ("stv", "Single transferable vote (ranked, multi-seat)"),
+                    ("approval", "Approval (any number of choices)"),
+                ],
+                default="plurality",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="pollarchive",
+            name="winners",
+            field=models.JSONField(default=list),
+        ),
+        migrations.CreateModel(
+            name="Ballot",
+            fields=[
+                (
+                    "vote",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="ballot",
+                        serialize=False,
+                        to="voting.vote",
+                    ),
+                ),
+                ("rankings", models.BinaryField()),
+                (
+                    "poll",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ballots",
+                        to="voting.poll",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0005_ballots_and_voting_methods"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("sequence", models.PositiveBigIntegerField()),
+                ("vote_id", models.BigIntegerField()),
+                ("previous_hash", models.CharField(max_length=64)),
+                ("entry_hash", models.CharField(max_length=64)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "poll",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ledger_entries",
+                        to="voting.poll",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "ledger entries",
+                "ordering": ["poll", "sequence"],
+            },
+        ),
+        migrations.CreateModel(
+            name="LedgerCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveIntegerField()),
+                ("first_sequence", models.PositiveBigIntegerField()),
+                ("last_sequence", models.PositiveBigIntegerField()),
+                ("merkle_root", models.CharField(max_length=64)),
+                ("chain_hash", models.CharField(max_length=64)),
+                ("date_created", models.DateTimeField(auto_now_add=True)),
+                ("verified_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "poll",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ledger_checkpoints",
+                        to="voting.poll",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["poll", "index"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="ledgerentry",
+            constraint=models.UniqueConstraint(
+                fields=("poll", "sequence"), name="unique_poll_sequence"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="ledgercheckpoint",
+            constraint=models.UniqueConstraint(
+                fields=("poll", "index"), name="unique_poll_checkpoint"
+            ),
+        ),
+    ]
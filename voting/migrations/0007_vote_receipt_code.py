@@ -0,0 +1,34 @@
+# Generated by Django 4.2.1 on 2026-10-19 18:40
+
+from django.db import migrations, models
+import voting.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0006_vote_ledger"),
+    ]
+
+    operations = [
+        # Existing votes keep a NULL code; a callable default on AddField
+        # would be evaluated once and give every one of them the same code.
+        migrations.AddField(
+            model_name="vote",
+            name="receipt_code",
+            field=models.CharField(
+                editable=False, max_length=12, null=True, unique=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="vote",
+            name="receipt_code",
+            field=models.CharField(
+                default=voting.models.generate_receipt_code,
+                editable=False,
+                max_length=12,
+                null=True,
+                unique=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0007_vote_receipt_code"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="candidate",
+            name="thumbnails",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:56
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0008_candidate_thumbnails"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="voter",
+            index=models.Index(
+                django.db.models.functions.text.Upper("email"),
+                name="voter_email_upper_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="voter",
+            index=models.Index(
+                django.db.models.functions.text.Upper("last_name"),
+                name="voter_last_name_upper_idx",
+            ),
+        ),
+    ]
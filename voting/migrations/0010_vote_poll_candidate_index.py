@@ -0,0 +1,19 @@
+# Generated by Django 4.2.1 on 2026-10-19 18:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0009_voter_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="vote",
+            index=models.Index(
+                fields=["poll", "candidate"], name="vote_poll_candidate_idx"
+            ),
+        ),
+    ]
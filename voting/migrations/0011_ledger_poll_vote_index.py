@@ -0,0 +1,17 @@
+# Generated by Django 4.2.1 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0010_vote_poll_candidate_index"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="ledgerentry",
+            index=models.Index(fields=["poll", "vote_id"], name="ledger_poll_vote_idx"),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.1 on 2026-10-19 18:27
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def complete_existing(apps, schema_editor):
+    # Archives made before this field deleted their rows in the same run
+    PollArchive = apps.get_model("voting", "PollArchive")
+    PollArchive.objects.update(completed_at=F("archived_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("voting", "0011_ledger_poll_vote_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pollarchive",
+            name="completed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(complete_existing, migrations.RunPython.noop),
+    ]
@@ -1,22 +1,95 @@
 import datetime
+import secrets
 import uuid
 
-from django.db import models
-from django.db.models import Q
+from django.db import IntegrityError, models, router, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncMinute, Upper
 from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.core.validators import MinValueValidator
 from django.db.models.query import QuerySet
 from django.urls import reverse
 from phonenumber_field.modelfields import PhoneNumberField
 from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
-# now = datetime.datetime.now()
-time  = timezone.now() + datetime.timedelta(hours=1)
-now = time.time()
+
+
+class SoftDeleteQuerySet(models.QuerySet):
+    """ Bulk operations for models with an ``is_deleted`` flag """
+    chunk_size = 1000
+
+    def update_in_chunks(self, chunk_size=None, **values):
+        """ Apply ``values`` to the matched rows with one UPDATE per
+        ``chunk_size`` primary keys, so no statement locks the whole table.
+
+        Returns the number of rows updated.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        # The keys too are read from the database written to, not a replica
+        db = self._db or router.db_for_write(self.model)
+        manager = self.model._base_manager.db_manager(db)
+        queryset = self.order_by("pk").using(db)
+        updated = 0
+        last_pk = None
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list("pk", flat=True)[:chunk_size])
+            if not pks:
+                return updated
+            updated += manager.filter(pk__in=pks).update(**values)
+            last_pk = pks[-1]
+
+    def soft_delete(self, chunk_size=None):
+        return self.update_in_chunks(chunk_size, is_deleted=True, deleted_at=timezone.now())
+
+    def restore(self, chunk_size=None):
+        return self.update_in_chunks(chunk_size, is_deleted=False)
+
+
+class LiveManager(models.Manager.from_queryset(SoftDeleteQuerySet)):
+    """ Default manager that hides soft-deleted (``is_deleted``) rows.
+
+    Models using it keep an ``all_objects`` manager for the tombstones.
+    """
+
+    def get_queryset(self) -> QuerySet:
+        return super().get_queryset().filter(is_deleted=False)
+
+
+class SoftDeleteUniqueMixin:
+    """ For models whose default manager hides soft-deleted rows: unique
+    fields are also checked against those rows (through ``all_objects``),
+    which the database still holds and would refuse to duplicate.
+    """
+
+    def _perform_unique_checks(self, unique_checks):
+        errors = super()._perform_unique_checks(unique_checks)
+        for model_class, unique_check in unique_checks:
+            lookup = {}
+            for field_name in unique_check:
+                field = self._meta.get_field(field_name)
+                value = getattr(self, field.attname)
+                if value is None or (field.primary_key and not self._state.adding):
+                    break
+                lookup[field_name] = value
+            else:
+                tombstones = model_class.all_objects.filter(is_deleted=True, **lookup)
+                if not self._state.adding and self.pk is not None:
+                    tombstones = tombstones.exclude(pk=self.pk)
+                if tombstones.exists():
+                    key = unique_check[0] if len(unique_check) == 1 else NON_FIELD_ERRORS
+                    errors.setdefault(key, []).append(self.unique_error_message(model_class, unique_check))
+        return errors
 
 
 class UserManager(BaseUserManager):
 
+    def get_queryset(self) -> QuerySet:
+        return super().get_queryset().filter(is_deleted=False)
+
     def create_user(self, email, password=None, **extra_fields):
         """ Creates and save new user(voter)"""
         if not email:
@@ -36,7 +109,7 @@ class UserManager(BaseUserManager):
         return self.create_user(email, password, **extra_fields)
 
 
-class User(AbstractBaseUser, PermissionsMixin):
+class User(SoftDeleteUniqueMixin, AbstractBaseUser, PermissionsMixin):
     """Custom user model """
     email = models.EmailField(
         verbose_name="email address", max_length=255, unique=True)
@@ -49,6 +122,7 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_deleted = models.BooleanField(default=False)
 
     objects = UserManager()
+    all_objects = models.Manager()
 
     REQUIRED_FIELDS = []
     USERNAME_FIELD = "email"
@@ -66,13 +140,20 @@ class User(AbstractBaseUser, PermissionsMixin):
         return f'{self.first_name} {self.last_name}'
 
 
-class Poll(models.Model):
+class Poll(SoftDeleteUniqueMixin, models.Model):
 
-    class PollObjects(models.Manager):
+    class VotingMethod(models.TextChoices):
+        PLURALITY = "plurality", "Plurality (one choice)"
+        IRV = "irv", "Instant runoff (ranked)"
+        STV = "stv", "Single transferable vote (ranked, multi-seat)"
+        APPROVAL = "approval", "Approval (any number of choices)"
+
+    class PollObjects(LiveManager):
+        """ Polls open at the current local time """
         def get_queryset(self) -> QuerySet:
+            now = timezone.localtime().time()
             return super().get_queryset().filter(
-                Q(start_time__lte=now) & Q(
-                    end_time__gte=now) & Q(is_deleted=False)
+                Q(start_time__lte=now) & Q(end_time__gte=now)
             )
 
     name = models.CharField(max_length=255, unique=True)
@@ -81,16 +162,27 @@ class Poll(models.Model):
         default=datetime.time(8, 0))  # poll starts at 8:00am
     end_time = models.TimeField(
         default=datetime.time(16, 0))  # poll ends at 4:00pm
+    voting_method = models.CharField(
+        max_length=20, choices=VotingMethod.choices, default=VotingMethod.PLURALITY)
+    seats = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
     is_deleted = models.BooleanField(default=False)
     deleted_at = models.DateTimeField(auto_now=True)
     date_created = models.DateTimeField(auto_now_add=True)
     last_updated = models.DateTimeField(auto_now=True)
 
-    objects = models.Manager()  # default manager
-    pollobjects = PollObjects()  # custom 
-    
+    objects = LiveManager()  # default manager, live polls only
+    all_objects = SoftDeleteQuerySet.as_manager()  # including soft-deleted polls
+    pollobjects = PollObjects()  # live polls open right now
+
     class Meta:
         ordering = ["-start_time", "name"]
+        indexes = [
+            models.Index(
+                fields=["start_time", "end_time"],
+                name="poll_live_window_idx",
+                condition=Q(is_deleted=False),
+            ),
+        ]
 
 
     def __str__(self):
@@ -103,27 +195,68 @@ class Poll(models.Model):
             return True
         return False
 
+    def seconds_until_open(self):
+        """ Seconds until the poll next opens, 0 while it is open """
+        if self.is_active:
+            return 0
+        now = datetime.datetime.now()
+        opens = datetime.datetime.combine(now.date(), self.start_time)
+        if opens <= now:
+            opens += datetime.timedelta(days=1)
+        return int((opens - now).total_seconds())
+
     def get_absolute_url(self):
-        return reverse("voting:poll-detail", args=(str(self.id)))
+        return reverse("voting:poll-detail", args=[self.id])
 
     def get_total_vote(self):
         return self.poll_votes.count()
+
+    @property
+    def uses_ballots(self):
+        """ Whether votes carry a full ``Ballot`` rather than a single choice """
+        return self.voting_method != self.VotingMethod.PLURALITY
     
     
 class Candidate(models.Model):
     name = models.CharField(max_length=100, unique=True)
     image = models.ImageField(upload_to="e_voting/candidates", null=True, blank=True)
+    # Storage names of the photo's thumbnails, {format: {width: name}};
+    # filled in by voting.images once the upload has been processed
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     poll = models.ForeignKey(
         Poll, on_delete=models.CASCADE, null=True, related_name="candidates")
 
     def __str__(self):
         return self.name
 
+    def _srcset(self, image_format):
+        return ", ".join(
+            f"{default_storage.url(name)} {width}w"
+            for width, name in sorted(self.thumbnails.get(image_format, {}).items(), key=lambda item: int(item[0]))
+        )
+
+    @property
+    def webp_srcset(self):
+        return self._srcset("webp")
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset("jpeg")
+
+    @property
+    def thumbnail_url(self):
+        """ Smallest JPEG thumbnail; empty until the upload is processed, as
+        raw uploads are never served """
+        jpegs = self.thumbnails.get("jpeg")
+        if jpegs:
+            return default_storage.url(jpegs[min(jpegs, key=int)])
+        return ""
+
     def get_vote_count(self):
         return self.candidate_votes.count()
 
 
-class Voter(models.Model):
+class Voter(SoftDeleteUniqueMixin, models.Model):
     uuid = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     email = models.EmailField(verbose_name="email address", max_length=255, unique=True)
     first_name = models.CharField(max_length=255)
@@ -137,6 +270,21 @@ class Voter(models.Model):
     deleted_at = models.DateTimeField(auto_now=True)
     date_created = models.DateTimeField(auto_now_add=True)
 
+    objects = LiveManager()
+    all_objects = SoftDeleteQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["poll", "is_voted"],
+                name="voter_live_poll_idx",
+                condition=Q(is_deleted=False),
+            ),
+            # Case-insensitive exact search in the admin (email__iexact)
+            models.Index(Upper("email"), name="voter_email_upper_idx"),
+            models.Index(Upper("last_name"), name="voter_last_name_upper_idx"),
+        ]
+
     def __str__(self):
         return self.email
 
@@ -151,6 +299,24 @@ class Voter(models.Model):
         return False
     
 
+# Crockford base32: no I, L, O or U, so codes survive being read out loud
+RECEIPT_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+RECEIPT_LENGTH = 12  # 60 random bits
+
+
+def generate_receipt_code():
+    return "".join(secrets.choice(RECEIPT_ALPHABET) for _ in range(RECEIPT_LENGTH))
+
+
+def normalize_receipt_code(code):
+    """ Canonical form of a typed receipt code, None if it cannot be one """
+    code = code.upper().replace("-", "").replace(" ", "")
+    code = code.translate(str.maketrans("ILO", "110"))
+    if len(code) != RECEIPT_LENGTH or not set(code) <= set(RECEIPT_ALPHABET):
+        return None
+    return code
+
+
 class Vote(models.Model):
     poll = models.ForeignKey(
         Poll, on_delete=models.CASCADE, related_name="poll_votes")
@@ -158,6 +324,164 @@ class Vote(models.Model):
         Candidate, on_delete=models.CASCADE, related_name="candidate_votes")
     voted_by = models.ForeignKey(Voter, on_delete=models.CASCADE)
     date_created = models.DateTimeField(auto_now_add=True)
+    receipt_code = models.CharField(
+        max_length=RECEIPT_LENGTH, unique=True, null=True, editable=False,
+        default=generate_receipt_code)
 
     class Meta:
         unique_together = ("poll", "voted_by")
+        indexes = [
+            # Per-candidate counts of one poll from the index alone
+            models.Index(fields=["poll", "candidate"], name="vote_poll_candidate_idx"),
+        ]
+
+
+class Ballot(models.Model):
+    """ Full choice list behind a vote on a ranked or approval poll.
+
+    ``rankings`` packs the chosen candidate ids as uint32, most preferred
+    first (see ``voting.counting.pack_rankings``), so a poll's ballots load
+    in one query straight into the counting engines.
+    """
+    vote = models.OneToOneField(
+        Vote, on_delete=models.CASCADE, primary_key=True, related_name="ballot")
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="ballots")
+    rankings = models.BinaryField()
+
+    def __str__(self):
+        return f'Ballot for {self.vote_id}'
+
+
+class LedgerEntry(models.Model):
+    """ Append-only record of a cast vote, hash-chained per poll.
+
+    ``entry_hash`` is the sha256 of ``previous_hash`` and the vote's payload
+    (see ``voting.ledger``), so changing or deleting a vote, or an entry,
+    breaks the chain from that point on. ``vote_id`` is deliberately not a
+    foreign key: the entry has to outlive the row it vouches for.
+    """
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="ledger_entries")
+    sequence = models.PositiveBigIntegerField()
+    vote_id = models.BigIntegerField()
+    previous_hash = models.CharField(max_length=64)
+    entry_hash = models.CharField(max_length=64)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["poll", "sequence"]
+        verbose_name_plural = "ledger entries"
+        constraints = [
+            models.UniqueConstraint(fields=["poll", "sequence"], name="unique_poll_sequence"),
+        ]
+        indexes = [
+            # The entry of one vote, for receipt lookups
+            models.Index(fields=["poll", "vote_id"], name="ledger_poll_vote_idx"),
+        ]
+
+    def __str__(self):
+        return f'{self.poll_id}#{self.sequence}'
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Ledger entries cannot be changed")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries cannot be deleted")
+
+
+class LedgerCheckpoint(models.Model):
+    """ Merkle root over one fixed-size batch of a poll's ledger entries """
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="ledger_checkpoints")
+    index = models.PositiveIntegerField()
+    first_sequence = models.PositiveBigIntegerField()
+    last_sequence = models.PositiveBigIntegerField()
+    merkle_root = models.CharField(max_length=64)
+    chain_hash = models.CharField(max_length=64)  # entry_hash of the batch's last entry
+    date_created = models.DateTimeField(auto_now_add=True)
+    verified_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["poll", "index"]
+        constraints = [
+            models.UniqueConstraint(fields=["poll", "index"], name="unique_poll_checkpoint"),
+        ]
+
+    def __str__(self):
+        return f'{self.poll_id} checkpoint {self.index}'
+
+
+class TurnoutBucket(models.Model):
+    """ Number of votes cast in a poll during one minute """
+    poll = models.ForeignKey(
+        Poll, on_delete=models.CASCADE, related_name="turnout_buckets")
+    minute = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["minute"]
+        constraints = [
+            models.UniqueConstraint(fields=["poll", "minute"], name="unique_poll_minute"),
+        ]
+
+    def __str__(self):
+        return f'{self.poll} {self.minute:%H:%M}: {self.count}'
+
+    @classmethod
+    def record(cls, vote):
+        """ Count ``vote`` in the bucket of the minute it was cast """
+        minute = vote.date_created.replace(second=0, microsecond=0)
+        bucket = cls.objects.filter(poll_id=vote.poll_id, minute=minute)
+        if bucket.update(count=F("count") + 1):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(poll_id=vote.poll_id, minute=minute, count=1)
+        except IntegrityError:
+            # Another worker created the bucket first
+            bucket.update(count=F("count") + 1)
+
+    @classmethod
+    def rebuild(cls, poll):
+        """ Recompute all of ``poll``'s buckets from its votes """
+        counts = (
+            Vote.objects.filter(poll=poll)
+            .annotate(bucket=TruncMinute("date_created"))
+            .values_list("bucket")
+            .annotate(total=Count("id"))
+            .order_by()
+        )
+        with transaction.atomic():
+            cls.objects.filter(poll=poll).delete()
+            cls.objects.bulk_create(
+                cls(poll=poll, minute=minute, count=total) for minute, total in counts
+            )
+
+
+class PollArchive(models.Model):
+    """ Record of a poll whose votes and voters were moved to cold storage """
+    poll = models.OneToOneField(
+        Poll, on_delete=models.CASCADE, related_name="archive")
+    location = models.CharField(max_length=500)
+    voter_count = models.PositiveIntegerField(default=0)
+    vote_count = models.PositiveIntegerField(default=0)
+    results = models.JSONField(default=dict)  # candidate id -> (first-round) votes at archive time
+    winners = models.JSONField(default=list)  # elected candidate ids at archive time
+    archived_at = models.DateTimeField(auto_now_add=True)
+    # Set once the archived rows are all deleted from the live tables
+    completed_at = models.DateTimeField(null=True, blank=True)
+    restored_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.poll} archive'
+
+    @property
+    def is_complete(self):
+        return self.completed_at is not None
+
+    @property
+    def is_restored(self):
+        return self.restored_at is not None
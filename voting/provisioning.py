@@ -0,0 +1,183 @@
+""" Bulk provisioning of polls, with their candidates and voters, from a
+manifest.
+
+A manifest is JSON, or YAML when PyYAML is installed::
+
+    {"polls": [{
+        "name": "Student union 2024",
+        "description": "...",
+        "start_time": "08:00", "end_time": "16:00",
+        "voting_method": "plurality", "seats": 1,
+        "candidates": ["Ada Obi", {"name": "Bola Ade"}],
+        "voters": [{"email": "...", "first_name": "...", "last_name": "...",
+                    "phone_number": "..."}],
+        "voters_csv": "registers/union.csv"
+    }]}
+
+``voters`` and ``voters_csv`` (headers as for the CSV import, path
+relative to the manifest) may be combined. Everything is checked before
+anything is written: polls and candidates must be valid and new, or
+nothing is created; voters go through ``importing.prepare_register``
+against the registered voters and every poll of the manifest, and only the
+rows it rejects are left out. Polls, candidates and voters are then
+created with one ``bulk_create`` each, in a single transaction.
+"""
+import csv
+import json
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from voting import importing
+from voting.models import Candidate, Poll, Voter
+
+try:
+    import yaml
+except ImportError:  # optional: manifests are then JSON only
+    yaml = None
+
+POLL_FIELDS = ["name", "description", "start_time", "end_time", "voting_method", "seats"]
+BATCH_SIZE = 1000
+
+
+class ManifestError(ValueError):
+    """ A manifest that cannot be provisioned; ``errors`` lists why """
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def load_manifest(path):
+    path = Path(path)
+    with open(path, encoding="utf-8") as fh:
+        if path.suffix in (".yaml", ".yml"):
+            if yaml is None:
+                raise ManifestError(["YAML manifests need PyYAML installed"])
+            manifest = yaml.safe_load(fh)
+        else:
+            manifest = json.load(fh)
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("polls"), list):
+        raise ManifestError(['a manifest is an object with a "polls" list'])
+    return manifest
+
+
+def read_voters(spec, base_dir):
+    """ Register rows of one manifest poll """
+    rows = list(spec.get("voters") or [])
+    if not all(isinstance(row, dict) for row in rows):
+        raise ManifestError([f'{spec.get("name")}: each of "voters" is an object keyed by '
+                             f'{", ".join(importing.EXPECTED_HEADERS)}'])
+    if spec.get("voters_csv"):
+        with open(Path(base_dir) / spec["voters_csv"], encoding="utf-8", newline="") as fh:
+            reader = csv.DictReader(fh)
+            if reader.fieldnames != importing.EXPECTED_HEADERS:
+                raise ManifestError([
+                    f'{spec["voters_csv"]}: expected headers {", ".join(importing.EXPECTED_HEADERS)}'
+                ])
+            rows.extend(reader)
+    return rows
+
+
+class Provisioning:
+    """ The checked content of a manifest, ready to be created """
+
+    def __init__(self):
+        self.polls = []  # unsaved Polls
+        self.candidates = []  # (index of the poll, unsaved Candidate)
+        self.reports = []  # importing.ImportReport per poll
+
+    @property
+    def voter_count(self):
+        return sum(len(report.valid) for report in self.reports)
+
+    def create(self):
+        """ Create everything; returns the saved polls """
+        with transaction.atomic():
+            polls = Poll.objects.bulk_create(self.polls)
+            if any(poll.pk is None for poll in polls):
+                # Backends that cannot return ids from a bulk insert
+                ids = dict(Poll.all_objects.filter(name__in=[poll.name for poll in polls])
+                           .values_list("name", "pk"))
+                for poll in polls:
+                    poll.pk = ids[poll.name]
+            for index, candidate in self.candidates:
+                candidate.poll = polls[index]
+            Candidate.objects.bulk_create([candidate for _, candidate in self.candidates],
+                                          batch_size=BATCH_SIZE)
+            for poll, report in zip(polls, self.reports):
+                report.poll_id = poll.pk
+            Voter.objects.bulk_create(
+                (voter for report in self.reports for voter in report.build_voters()),
+                batch_size=BATCH_SIZE,
+            )
+        return polls
+
+
+def prepare(manifest, base_dir=".", region=None):
+    """ Check ``manifest``; returns a ``Provisioning`` or raises
+    ``ManifestError`` listing every problem with its polls or candidates """
+    errors = []
+    provisioning = Provisioning()
+    poll_names = {}
+    candidate_names = {}
+
+    for index, spec in enumerate(manifest["polls"]):
+        where = f"polls[{index}]"
+        if not isinstance(spec, dict):
+            errors.append(f"{where}: expected an object")
+            continue
+        unknown = set(spec) - set(POLL_FIELDS) - {"candidates", "voters", "voters_csv"}
+        if unknown:
+            errors.append(f'{where}: unknown field(s) {", ".join(sorted(unknown))}')
+        poll = Poll(**{field: spec[field] for field in POLL_FIELDS if field in spec})
+        try:
+            # Fields left out keep their defaults (description stays empty);
+            # uniqueness is checked below, for all of them at once
+            defaults = [field for field in POLL_FIELDS if field not in spec and field != "name"]
+            poll.full_clean(exclude=defaults, validate_unique=False)
+        except ValidationError as e:
+            errors.extend(f"{where}.{field}: {' '.join(messages)}"
+                          for field, messages in e.message_dict.items())
+        if poll.name in poll_names:
+            errors.append(f"{where}: same name as polls[{poll_names[poll.name]}]")
+        poll_names.setdefault(poll.name, index)
+        provisioning.polls.append(poll)
+
+        for position, candidate_spec in enumerate(spec.get("candidates") or []):
+            name = candidate_spec.get("name") if isinstance(candidate_spec, dict) else candidate_spec
+            candidate = Candidate(name=str(name or "").strip())
+            try:
+                candidate.full_clean(exclude=["poll"], validate_unique=False)
+            except ValidationError as e:
+                errors.extend(f"{where}.candidates[{position}].{field}: {' '.join(messages)}"
+                              for field, messages in e.message_dict.items())
+            # Candidate names are unique across all polls
+            if candidate.name in candidate_names:
+                errors.append(f"{where}.candidates[{position}]: {candidate.name!r} is also "
+                              f"candidate {candidate_names[candidate.name]}")
+            candidate_names.setdefault(candidate.name, f"{position} of polls[{index}]")
+            provisioning.candidates.append((index, candidate))
+
+    taken = Poll.all_objects.filter(name__in=list(poll_names)).values_list("name", flat=True)
+    errors.extend(f"polls[{poll_names[name]}]: a poll named {name!r} already exists" for name in taken)
+    taken = Candidate.objects.filter(name__in=list(candidate_names)).values_list("name", flat=True)
+    errors.extend(f"candidate {name!r} already exists" for name in taken)
+    if errors:
+        raise ManifestError(errors)
+
+    # One read of the voters the registers could collide with, for every
+    # poll; voters accepted for one poll of the manifest count as registered
+    # for the next
+    registers = [read_voters(spec, base_dir) for spec in manifest["polls"]]
+    registered = importing.RegisteredVoters(importing.registered_voters(
+        row.get("email") for rows in registers for row in rows
+    ))
+    for index, rows in enumerate(registers):
+        key = ("manifest", index)  # stands in for the poll id until it exists
+        report = importing.prepare_register(rows, key, registered, region)
+        for email, _, _, _ in report.valid:
+            registered.add(email, "", key)
+        provisioning.reports.append(report)
+    return provisioning
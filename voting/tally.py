@@ -0,0 +1,442 @@
+""" Live vote tallies shared by the web workers.
+
+Each poll gets a shared memory segment (``multiprocessing.shared_memory``)
+of int64s::
+
+    header      magic, slot count, stripe count, last reconciled (unix time),
+                overflow (set once a candidate found no free slot)
+    candidates  candidate id held by each slot, 0 while the slot is free
+    owners      pid of the process owning each stripe, 0 for none
+    base        per slot, the votes taken from the database by the last
+                rebuild or reconcile
+    stripes     per stripe and slot, the votes counted since by its owner
+
+Every worker claims a stripe of its own and is the only process writing to
+it, so counting a vote is a plain in-memory increment with no lock shared
+between processes, and reading the tally sums ``base`` and the stripes
+without taking any lock. A vote is counted once its transaction commits.
+
+The database stays the source of truth. Segments exist for open polls
+only: one is built from ``Vote`` when the first vote of a poll is counted
+and rebuilt for every open poll when gunicorn starts (see
+``gunicorn.conf.py``); it is removed, with its lock file, once the poll
+is archived or read after it closed, or by ``reconcile_tallies``. Closed
+polls are counted from the database. One process at a time
+reconciles a segment at most every ``TALLY_RECONCILE_SECONDS``: whatever the
+stripes miss (a worker that died between commit and increment, votes
+restored from an archive) is folded into ``base``. Creating a segment,
+claiming a slot or a stripe and reconciling take an ``fcntl`` lock on a
+file beside it.
+
+With ``LIVE_TALLY`` off, without ``fcntl`` (Windows) or for a poll with
+more candidates than ``TALLY_CANDIDATE_SLOTS``, ``poll_totals`` returns
+None and callers count from the database.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from voting.models import Poll, Vote
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: the tally is then disabled
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = 0x7A11E5
+RETIRED = -1  # magic of a segment replaced by a rebuild
+HEADER = 5
+_MAGIC, _SLOTS, _STRIPES, _RECONCILED_AT, _OVERFLOW = range(HEADER)
+WORD = 8  # bytes per int64
+
+# Segments attached by this process, by poll id
+_tallies = {}
+# The threads of a worker share its stripes
+_thread_lock = threading.Lock()
+
+
+def enabled():
+    return settings.LIVE_TALLY and fcntl is not None
+
+
+def segment_name(poll_id):
+    database = settings.DATABASES["default"]
+    # Deployments (or test runs) sharing a host must not share tallies
+    key = f'{database.get("HOST")}:{database.get("PORT")}:{database.get("NAME")}'
+    return f"evt-{hashlib.sha1(key.encode()).hexdigest()[:8]}-{poll_id}"
+
+
+def segment_size(slots, stripes):
+    return WORD * (HEADER + slots + stripes + (stripes + 1) * slots)
+
+
+def segment_lock_path(name):
+    return os.path.join(tempfile.gettempdir(), f"{name}.lock")
+
+
+@contextmanager
+def segment_lock(name, blocking=True):
+    """ Exclusive lock on segment ``name`` across processes; yields whether
+    it was acquired (always, when ``blocking``) """
+    fd = os.open(segment_lock_path(name), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+    finally:
+        os.close(fd)  # releases the lock
+
+
+def _untrack(shm):
+    # Before Python 3.13 every process attaching a segment registers it with
+    # its resource tracker, which unlinks it when that process exits; the
+    # segments must outlive recycled workers.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _attach(name):
+    try:
+        return _untrack(shared_memory.SharedMemory(name))
+    except FileNotFoundError:
+        return None
+
+
+def _retire(shm):
+    """ Flag ``shm`` for the processes still attached to it, then remove it """
+    np.ndarray((1,), dtype=np.int64, buffer=shm.buf)[_MAGIC] = RETIRED
+    # unlink() unregisters it from the resource tracker, which _untrack did
+    resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+    shm.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def database_counts(poll_id):
+    """ ``{candidate id: votes}`` of ``poll_id`` from the primary database """
+    return dict(
+        Vote.objects.using("default").filter(poll_id=poll_id)
+        .order_by()
+        .values_list("candidate_id")
+        .annotate(votes=Count("pk"))
+    )
+
+
+class PollTally:
+    """ One poll's segment, as attached by this process """
+
+    def __init__(self, poll_id, shm):
+        self.poll_id = poll_id
+        self.name = shm.name
+        self.shm = shm
+        words = np.ndarray((shm.size // WORD,), dtype=np.int64, buffer=shm.buf)
+        self.header = words[:HEADER]
+        slots, stripes = int(self.header[_SLOTS]), int(self.header[_STRIPES])
+        self.candidates = words[HEADER:HEADER + slots]
+        self.owners = words[HEADER + slots:HEADER + slots + stripes]
+        start = HEADER + slots + stripes
+        # Row 0 is the base, row n + 1 stripe n
+        self.counts = words[start:start + (stripes + 1) * slots].reshape(stripes + 1, slots)
+        self.row = None
+        self.row_pid = None
+        self.fresh = False  # built from the database by this process
+
+    @classmethod
+    def create(cls, poll_id):
+        """ Build ``poll_id``'s segment from the database, replacing any
+        segment of that name. The caller holds the segment lock. """
+        name = segment_name(poll_id)
+        stale = _attach(name)
+        if stale is not None:
+            # Processes still attached to it reopen it by name
+            _retire(stale)
+
+        slots, stripes = settings.TALLY_CANDIDATE_SLOTS, settings.TALLY_STRIPES
+        shm = _untrack(shared_memory.SharedMemory(name, create=True, size=segment_size(slots, stripes)))
+        header = np.ndarray((HEADER,), dtype=np.int64, buffer=shm.buf)
+        header[_SLOTS], header[_STRIPES] = slots, stripes
+        tally = cls(poll_id, shm)
+        tally._load(database_counts(poll_id))
+        # Written last: attached processes ignore the segment until then
+        tally.header[_MAGIC] = MAGIC
+        tally.fresh = True
+        return tally
+
+    @classmethod
+    def open(cls, poll_id, create=False):
+        """ Attach ``poll_id``'s segment; without one it is built when
+        ``create``, else None is returned """
+        name = segment_name(poll_id)
+        shm = _attach(name)
+        if shm is not None and shm.buf[:WORD].cast("q")[_MAGIC] == MAGIC:
+            return cls(poll_id, shm)
+        if shm is not None:
+            shm.close()
+        if not create:
+            return None
+        with segment_lock(name):
+            # Another process may have built it while this one waited
+            shm = _attach(name)
+            if shm is not None and shm.buf[:WORD].cast("q")[_MAGIC] == MAGIC:
+                return cls(poll_id, shm)
+            if shm is not None:
+                shm.close()
+            return cls.create(poll_id)
+
+    @property
+    def retired(self):
+        return self.header[_MAGIC] != MAGIC
+
+    def close(self):
+        self.header = self.candidates = self.owners = self.counts = None
+        self.shm.close()
+
+    def _slot(self, candidate_id, allocate=False):
+        """ Slot of ``candidate_id``; with ``allocate`` a free slot is
+        taken for it (the caller holds the segment lock). None if full. """
+        found = np.flatnonzero(self.candidates == candidate_id)
+        if found.size:
+            return int(found[0])
+        if not allocate:
+            return None
+        free = np.flatnonzero(self.candidates == 0)
+        if not free.size:
+            self.header[_OVERFLOW] = 1
+            return None
+        self.candidates[free[0]] = candidate_id
+        return int(free[0])
+
+    def slot(self, candidate_id):
+        slot = self._slot(candidate_id)
+        if slot is None:
+            with segment_lock(self.name):
+                slot = self._slot(candidate_id, allocate=True)
+        return slot
+
+    def _own_row(self):
+        """ Counter row owned by this process, claimed on first use; None
+        if every stripe belongs to a live process """
+        pid = os.getpid()
+        if self.row_pid == pid:
+            return self.row
+        with segment_lock(self.name):
+            owners = [int(owner) for owner in self.owners]
+            if pid in owners:
+                stripe = owners.index(pid)
+            else:
+                # A dead worker's counts stay valid; its stripe is reused
+                free = [i for i, owner in enumerate(owners) if not owner or not _pid_alive(owner)]
+                stripe = free[0] if free else None
+                if stripe is not None:
+                    self.owners[stripe] = pid
+        self.row = None if stripe is None else stripe + 1
+        self.row_pid = pid
+        return self.row
+
+    def increment(self, candidate_id):
+        slot = self.slot(candidate_id)
+        if slot is None:
+            return False
+        with _thread_lock:
+            row = self._own_row()
+            if row is not None:
+                self.counts[row, slot] += 1
+                return True
+        # No stripe left: count into the base, under the segment lock
+        with segment_lock(self.name):
+            self.counts[0, slot] += 1
+        return True
+
+    def totals(self):
+        """ ``{candidate id: votes}``, read without locking """
+        sums = self.counts.sum(axis=0)
+        return {int(candidate): int(votes) for candidate, votes in zip(self.candidates, sums) if candidate}
+
+    def _load(self, counts):
+        for candidate_id in counts:
+            self._slot(candidate_id, allocate=True)
+        self.counts[0] = 0
+        for candidate_id, votes in counts.items():
+            slot = self._slot(candidate_id)
+            if slot is not None:
+                self.counts[0, slot] = votes
+        self.header[_RECONCILED_AT] = int(time.time())
+
+    def reconcile(self, blocking=True):
+        """ Bring the tally in line with the database by adjusting ``base``.
+        Returns ``{candidate id: drift}`` of the slots that were off, None
+        if another process is reconciling (and ``blocking`` is False).
+
+        Votes committed but not yet counted while this runs may be counted
+        twice until the next reconcile.
+        """
+        with segment_lock(self.name, blocking) as acquired:
+            if not acquired:
+                return None
+            if not blocking and time.time() - self.header[_RECONCILED_AT] < settings.TALLY_RECONCILE_SECONDS:
+                return {}  # done by another process meanwhile
+            for _ in range(3):
+                counted = self.counts[1:].sum(axis=0)
+                counts = database_counts(self.poll_id)
+                # Retry if a vote was counted while the database was read
+                if (self.counts[1:].sum(axis=0) == counted).all():
+                    break
+            for candidate_id in counts:
+                self._slot(candidate_id, allocate=True)
+            expected = np.zeros_like(counted)
+            for candidate_id, votes in counts.items():
+                slot = self._slot(candidate_id)
+                if slot is not None:
+                    expected[slot] = votes
+            drift = expected - (self.counts[0] + counted)
+            self.counts[0] = expected - counted
+            self.header[_RECONCILED_AT] = int(time.time())
+        return {int(self.candidates[slot]): int(drift[slot]) for slot in np.flatnonzero(drift)}
+
+
+def get_tally(poll_id, create=False):
+    """ This process's view of ``poll_id``'s tally; None when disabled or
+    when the poll has no segment and ``create`` is not set """
+    if not enabled():
+        return None
+    tally = _tallies.get(poll_id)
+    if tally is not None and tally.retired:
+        tally.close()
+        del _tallies[poll_id]
+        tally = None
+    if tally is None:
+        tally = PollTally.open(poll_id, create)
+        if tally is None:
+            return None
+        _tallies[poll_id] = tally
+    return tally
+
+
+def record_vote(poll_id, candidate_id):
+    """ Count a committed vote. Never raises: a missed vote is picked up
+    by the next reconcile. """
+    try:
+        attached = poll_id in _tallies and not _tallies[poll_id].retired
+        tally = get_tally(poll_id)
+        if tally is None and enabled() and Poll.pollobjects.filter(pk=poll_id).exists():
+            # Segments are only made for polls taking votes
+            tally = get_tally(poll_id, create=True)
+        if tally is None or (tally.fresh and not attached):
+            # Either no tally, or built just now from the database, which
+            # already has this vote
+            return
+        tally.increment(candidate_id)
+    except Exception:
+        logger.exception("Could not count a vote of poll %s in the live tally", poll_id)
+
+
+def poll_totals(poll):
+    """ ``{candidate id: votes}`` of ``poll`` from memory, reconciled first
+    when it is due. None when the live tally is unavailable, the poll has
+    no segment (no vote since it opened or since the server started) or is
+    closed, whose segment is dropped here; callers then count from the
+    database. """
+    if not enabled():
+        return None
+    try:
+        if not poll.is_active:
+            drop(poll.pk)
+            return None
+        tally = get_tally(poll.pk)
+        # Past TALLY_CANDIDATE_SLOTS candidates some have no counters
+        if tally is None or tally.header[_OVERFLOW]:
+            return None
+        if time.time() - tally.header[_RECONCILED_AT] >= settings.TALLY_RECONCILE_SECONDS:
+            tally.reconcile(blocking=False)
+        return tally.totals()
+    except Exception:
+        logger.exception("Live tally of poll %s unavailable", poll.pk)
+        return None
+
+
+def drop(poll_id):
+    """ Remove ``poll_id``'s segment and its lock file, if there are any """
+    name = segment_name(poll_id)
+    tally = _tallies.pop(poll_id, None)
+    if tally is not None:
+        tally.close()
+    shm = _attach(name)
+    if shm is not None:
+        shm.close()
+        with segment_lock(name):
+            # It may have been replaced before the lock was taken
+            shm = _attach(name)
+            if shm is not None:
+                _retire(shm)
+    try:
+        os.remove(segment_lock_path(name))
+    except FileNotFoundError:
+        pass
+
+
+# Archived polls no longer have their votes in the live tables (until restored)
+UNARCHIVED = Q(archive__isnull=True) | Q(archive__restored_at__isnull=False)
+
+
+def live_poll_ids():
+    return list(Poll.objects.filter(UNARCHIVED).order_by("pk").values_list("pk", flat=True))
+
+
+def open_poll_ids():
+    """ Live polls taking votes right now """
+    return list(Poll.pollobjects.filter(UNARCHIVED).order_by("pk").values_list("pk", flat=True))
+
+
+def drop_closed(keep=None):
+    """ Drop the segments of every poll that is not open (or in ``keep``) """
+    keep = open_poll_ids() if keep is None else keep
+    for poll_id in Poll.all_objects.exclude(pk__in=keep).values_list("pk", flat=True).iterator():
+        drop(poll_id)
+
+
+def rebuild_all():
+    """ Rebuild the segment of every open poll from the database and drop
+    the others (closed, deleted or archived polls). Returns the number
+    rebuilt. """
+    if not enabled():
+        return 0
+    rebuilt = open_poll_ids()
+    for poll_id in rebuilt:
+        with segment_lock(segment_name(poll_id)):
+            tally = PollTally.create(poll_id)
+        previous = _tallies.pop(poll_id, None)
+        if previous is not None:
+            previous.close()
+        _tallies[poll_id] = tally
+    drop_closed(keep=rebuilt)
+    return len(rebuilt)
+
+
+def drop_all():
+    """ Remove the segments of every live poll, when the server stops """
+    if enabled():
+        for poll_id in live_poll_ids():
+            drop(poll_id)
@@ -1,3 +1,780 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import smtplib
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.template.loader import get_template
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from e_voting import db_routers, warmup
+
+from voting import admin, archive, counting, images, importing, ledger, middleware, tally
+from voting.forms import NewUserForm, PollForm
+from voting.models import Ballot, Candidate, Poll, PollArchive, TurnoutBucket, User, Vote, Voter
+
+# Pages render without running collectstatic first
+plain_static = override_settings(
+    STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+
+
+def override(test, **options):
+    """ ``override_settings`` until the end of ``test`` (runtime.txt pins
+    Python 3.9, which has no ``TestCase.enterContext``) """
+    overridden = override_settings(**options)
+    overridden.enable()
+    test.addCleanup(overridden.disable)
+
+
+def open_poll(name="Test poll", candidates=2, voters=4):
+    poll = Poll.objects.create(
+        name=name, description="", start_time=datetime.time(0, 0), end_time=datetime.time(23, 59, 59))
+    for i in range(candidates):
+        Candidate.objects.create(name=f"{name} candidate {i}", poll=poll)
+    for i in range(voters):
+        Voter.objects.create(poll=poll, email=f"{name.replace(' ', '')}.{i}@example.com",
+                             first_name="Ada", last_name=f"Obi{i}")
+    return poll
+
+
+def cast_votes(client, poll):
+    """ Every voter of ``poll`` votes for its first candidate """
+    candidate = poll.candidates.first()
+    for voter in poll.voters.all():
+        response = client.post(
+            reverse("voting:vote", kwargs={"pk": poll.pk, "voter_pk": voter.pk}),
+            {"candidate": candidate.pk})
+        assert response.status_code == 302, response
+
+
+class LedgerTests(TestCase):
+
+    @mock.patch.object(ledger, "CHECKPOINT_SIZE", 2)
+    def test_vote_changed_after_verification_is_found(self):
+        poll = open_poll()
+        cast_votes(self.client, poll)
+        self.assertEqual(ledger.verify_poll(poll), (4, None, ""))
+
+        # Every batch is verified now; alter a vote inside the first one
+        vote = Vote.objects.filter(poll=poll).order_by("pk").first()
+        Vote.objects.filter(pk=vote.pk).update(candidate=poll.candidates.last())
+
+        checked, bad_sequence, reason = ledger.verify_poll(poll)
+        self.assertEqual(bad_sequence, 0)
+        self.assertIn("altered", reason)
+        # Trusting verified batches misses it
+        self.assertIsNone(ledger.verify_poll(poll, full=False)[1])
+
+
+@plain_static
+class VoteTests(TestCase):
+
+    def test_concurrent_second_vote_is_refused(self):
+        poll = open_poll(voters=1)
+        voter = poll.voters.get()
+        candidate = poll.candidates.first()
+        lock_poll = ledger.lock_poll
+
+        def vote_lands_first(poll_id):
+            # The other submission commits while this one waits for the lock
+            lock_poll(poll_id)
+            Vote.objects.create(poll=poll, candidate=candidate, voted_by=voter)
+
+        with mock.patch.object(ledger, "lock_poll", side_effect=vote_lands_first):
+            response = self.client.post(reverse("voting:vote", kwargs={"pk": poll.pk, "voter_pk": voter.pk}),
+                                        {"candidate": candidate.pk})
+        self.assertTemplateUsed(response, "voting/already_voted.html")
+        self.assertEqual(Vote.objects.filter(voted_by=voter).count(), 1)
+
+
+class SoftDeletedUniqueTests(TestCase):
+
+    def test_deleted_poll_name_is_taken(self):
+        poll = open_poll(candidates=0, voters=0)
+        Poll.objects.filter(pk=poll.pk).soft_delete()
+        form = PollForm({"name": poll.name, "start_time": "23:59", "end_time": "23:59:59",
+                         "voting_method": Poll.VotingMethod.PLURALITY, "seats": 1})
+        self.assertFalse(form.is_valid())
+        self.assertIn("name", form.errors)
+
+    def test_deleted_voter_email_is_taken(self):
+        poll = open_poll(candidates=0, voters=1)
+        voter = poll.voters.get()
+        Voter.objects.filter(pk=voter.pk).soft_delete()
+        again = Voter(poll=poll, email=voter.email, first_name="Ada", last_name="Obi")
+        with self.assertRaises(ValidationError) as raised:
+            again.full_clean()
+        self.assertIn("email", raised.exception.message_dict)
+        # The soft-deleted row itself still validates
+        Voter.all_objects.get(pk=voter.pk).full_clean()
+
+    def test_deleted_user_email_is_taken(self):
+        User.objects.create_user(email="gone@example.com", password="pw", is_deleted=True)
+        form = NewUserForm({"email": "gone@example.com", "password1": "S3cret-pass!",
+                            "password2": "S3cret-pass!"})
+        self.assertFalse(form.is_valid())
+        self.assertIn("email", form.errors)
+
+
+@plain_static
+class CandidatePhotoTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override(self, MEDIA_ROOT=media_root)
+        self.client.force_login(User.objects.create_user(email="admin@example.com", password="pw"))
+        self.poll = open_poll(candidates=0, voters=0)
+        self.url = reverse("voting:create-candidate", args=[self.poll.pk])
+
+    def png(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 300), "teal").save(buffer, "PNG")
+        return SimpleUploadedFile("photo.png", buffer.getvalue(), content_type="image/png")
+
+    def test_non_image_upload_is_rejected(self):
+        upload = SimpleUploadedFile("photo.html", b"<script>alert(1)</script>", content_type="text/html")
+        response = self.client.post(self.url, {"name": "Ada", "image": upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors["image"])
+        self.assertFalse(Candidate.objects.exists())
+
+    def test_only_processed_photos_are_served(self):
+        response = self.client.post(self.url, {"name": "Ada", "image": self.png()})
+        self.assertRedirects(response, self.poll.get_absolute_url(), fetch_redirect_response=False)
+        candidate = Candidate.objects.get()
+        raw_name = candidate.image.name
+        self.assertEqual(self.client.get(f"/media/{raw_name}").status_code, 404)
+        self.assertEqual(candidate.thumbnail_url, "")
+
+        images.process_candidate_image(candidate)
+        response = self.client.get(candidate.thumbnail_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["X-Content-Type-Options"], "nosniff")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.client.get(f"/media/{raw_name}").status_code, 404)
+
+
+@plain_static
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        override(self, ARCHIVE_STORAGE={
+            "BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": root}})
+        self.storage = archive.archive_storage()
+        self.poll = open_poll()
+        cast_votes(self.client, self.poll)
+
+    def test_archive_restore_and_archive_again(self):
+        first = archive.archive_poll(self.poll)
+        self.assertEqual((first.voter_count, first.vote_count), (4, 4))
+        self.assertFalse(Vote.objects.filter(poll=self.poll).exists())
+        self.assertFalse(Voter.all_objects.filter(poll=self.poll).exists())
+        with self.assertRaises(ValueError):
+            archive.archive_poll(self.poll)
+
+        archive.restore_poll(self.poll)
+        self.assertEqual(Vote.objects.filter(poll=self.poll).count(), 4)
+        self.assertEqual(Voter.objects.filter(poll=self.poll).count(), 4)
+
+        second = archive.archive_poll(self.poll)
+        self.assertIsNone(second.restored_at)
+        self.assertNotEqual(second.location, first.location)
+        self.assertEqual(second.vote_count, 4)
+        self.assertFalse(Vote.objects.filter(poll=self.poll).exists())
+
+    def test_approval_results_are_counted_from_ballots(self):
+        poll = open_poll(name="Approval poll")
+        Poll.objects.filter(pk=poll.pk).update(voting_method=Poll.VotingMethod.APPROVAL)
+        first, second = poll.candidates.order_by("pk")
+        for i, voter in enumerate(poll.voters.order_by("pk")):
+            approved = [first.pk, second.pk] if i < 2 else [second.pk]
+            self.client.post(reverse("voting:vote", kwargs={"pk": poll.pk, "voter_pk": voter.pk}),
+                             {"candidate": approved})
+        poll.refresh_from_db()
+        snapshot = archive.archive_poll(poll)
+        self.assertEqual(snapshot.results, {str(first.pk): 2, str(second.pk): 4})
+        self.assertEqual(snapshot.winners, [second.pk])
+        response = self.client.get(reverse("voting:poll-result", kwargs={"pk": poll.pk}))
+        self.assertEqual([c.pk for c in response.context["winning_candidates"]], [second.pk])
+
+    def test_failed_export_leaves_poll_live(self):
+        upload = archive._upload
+
+        def second_upload_fails(storage, name, path):
+            if not name.endswith("voters.jsonl.gz"):
+                raise ValueError(f"{name} was not stored intact")
+            return upload(storage, name, path)
+
+        with mock.patch.object(archive, "_upload", side_effect=second_upload_fails):
+            with self.assertRaises(ValueError):
+                archive.archive_poll(self.poll)
+        self.assertFalse(PollArchive.objects.exists())
+        self.assertEqual(Vote.objects.filter(poll=self.poll).count(), 4)
+        self.assertEqual(Voter.objects.filter(poll=self.poll).count(), 4)
+        # Only the (empty) directory of the run is left on local disk
+        runs, _ = self.storage.listdir(f"poll-{self.poll.pk}")
+        self.assertEqual(self.storage.listdir(f"poll-{self.poll.pk}/{runs[0]}"), ([], []))
+
+    def test_interrupted_deletes_resume(self):
+        with mock.patch.object(archive, "delete_in_batches", side_effect=[1, RuntimeError("lost")]):
+            with self.assertRaises(RuntimeError):
+                archive.archive_poll(self.poll)
+        interrupted = PollArchive.objects.get()
+        self.assertFalse(interrupted.is_complete)
+        # The poll takes no more votes, and cannot be restored half-way
+        voter = Voter.objects.create(poll=self.poll, email="late@example.com", first_name="Ada", last_name="Obi")
+        response = self.client.post(reverse("voting:vote", kwargs={"pk": self.poll.pk, "voter_pk": voter.pk}),
+                                    {"candidate": self.poll.candidates.first().pk})
+        self.assertEqual(response.status_code, 404)
+        with self.assertRaises(ValueError):
+            archive.restore_poll(self.poll)
+
+        resumed = archive.archive_poll(self.poll)
+        self.assertEqual((resumed.location, resumed.vote_count), (interrupted.location, 4))
+        self.assertTrue(resumed.is_complete)
+        self.assertFalse(Vote.objects.filter(poll=self.poll).exists())
+        # Registered after the export, so not archived and left live
+        self.assertEqual(list(Voter.all_objects.filter(poll=self.poll)), [voter])
+
+    def test_restore_clashing_with_a_new_voter_restores_nothing(self):
+        email = self.poll.voters.first().email
+        archive.archive_poll(self.poll)
+        Voter.objects.create(poll=open_poll("Other poll", voters=0), email=email,
+                             first_name="Ada", last_name="Obi")
+
+        with self.assertRaisesMessage(ValueError, "clash with live data"):
+            archive.restore_poll(self.poll)
+        self.assertFalse(Vote.objects.filter(poll=self.poll).exists())
+        self.assertFalse(PollArchive.objects.get().is_restored)
+
+
+@override_settings(DATABASE_ROUTERS=["e_voting.db_routers.ReplicaRouter"],
+                   REPLICA_MAX_LAG=5, REPLICA_LAG_CHECK_INTERVAL=0)
+class ReplicaRoutingTests(TestCase):
+    """ Routing between two SQLite databases: the test database as primary
+    and a file standing in for the replica, holding different polls """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after TestCase set up its databases, so the replica is a
+        # plain file outside the test transaction
+        directory = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, directory)
+        # connections.settings is settings.DATABASES
+        connections.settings[db_routers.REPLICA] = dict(
+            connections.settings["default"], NAME=f"{directory}/replica.sqlite3", TEST={})
+        cls.addClassCleanup(cls.remove_replica)
+        with override_settings(DATABASE_ROUTERS=[]):  # the router only migrates the primary
+            call_command("migrate", database=db_routers.REPLICA, verbosity=0, interactive=False)
+        Poll.objects.using(db_routers.REPLICA).create(
+            name="On replica", start_time=datetime.time(0, 0), end_time=datetime.time(1, 0))
+
+    @classmethod
+    def remove_replica(cls):
+        connections[db_routers.REPLICA].close()
+        del connections[db_routers.REPLICA]
+        del connections.settings[db_routers.REPLICA]
+
+    @classmethod
+    def setUpTestData(cls):
+        Poll.objects.create(name="On primary", start_time=datetime.time(0, 0), end_time=datetime.time(1, 0))
+
+    def setUp(self):
+        db_routers._lag.update(checked_at=0.0, seconds=0.0)
+        self.addCleanup(db_routers._lag.update, checked_at=0.0, seconds=0.0)
+        self.middleware = db_routers.ReplicaRoutingMiddleware(self.read_polls)
+        self.factory = RequestFactory()
+
+    def read_polls(self, request):
+        self.routed = {"polls": router.db_for_read(Poll), "sessions": router.db_for_read(Session)}
+        return HttpResponse(", ".join(Poll.objects.values_list("name", flat=True)))
+
+    def test_safe_request_reads_replica(self):
+        response = self.middleware(self.factory.get("/"))
+        self.assertEqual(response.content, b"On replica")
+        self.assertNotIn(self.middleware.cookie_name, response.cookies)
+        # Outside a request everything stays on the primary
+        self.assertEqual(list(Poll.objects.values_list("name", flat=True)), ["On primary"])
+
+    def test_write_pins_reads_to_primary(self):
+        response = self.middleware(self.factory.post("/"))
+        self.assertEqual(response.content, b"On primary")
+        pin = response.cookies[self.middleware.cookie_name]
+        self.assertEqual(pin["max-age"], settings.REPLICA_PIN_SECONDS)
+
+        request = self.factory.get("/")
+        request.COOKIES[self.middleware.cookie_name] = pin.value
+        self.assertEqual(self.middleware(request).content, b"On primary")
+
+    def test_safe_request_that_writes_pins_reads_to_primary(self):
+        def remove_polls(request):
+            Poll.objects.filter(name="On primary").soft_delete()
+            return HttpResponse()
+        response = db_routers.ReplicaRoutingMiddleware(remove_polls)(self.factory.get("/"))
+        self.assertIn(self.middleware.cookie_name, response.cookies)
+
+    def test_primary_only_apps_read_primary(self):
+        self.middleware(self.factory.get("/"))
+        self.assertEqual(self.routed, {"polls": db_routers.REPLICA, "sessions": "default"})
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.assertEqual(db_routers.read_database(), db_routers.REPLICA)
+        db_routers._lag["checked_at"] = 0.0
+        with mock.patch.object(db_routers, "replica_lag", return_value=float("inf")):
+            self.assertEqual(self.middleware(self.factory.get("/")).content, b"On primary")
+            self.assertEqual(db_routers.read_database(), "default")
+
+
+def count_votes(poll_id, candidate_ids, votes):
+    """ A worker process recording ``votes`` committed votes """
+    for i in range(votes):
+        tally.record_vote(poll_id, candidate_ids[i % len(candidate_ids)])
+
+
+@skipUnless(tally.fcntl, "live tallies need fcntl")
+@override_settings(LIVE_TALLY=True, TALLY_STRIPES=4, TALLY_RECONCILE_SECONDS=3600)
+class LiveTallyTests(TestCase):
+
+    def test_worker_processes_share_one_tally(self):
+        poll = open_poll(candidates=3, voters=0)
+        closed = Poll.objects.create(name="Closed poll", start_time=datetime.time(0, 0),
+                                     end_time=datetime.time(0, 0))
+        for poll_id in (poll.pk, closed.pk):
+            self.addCleanup(tally.drop, poll_id)
+
+        self.assertEqual(tally.rebuild_all(), 1)
+        self.assertIsNone(tally._attach(tally.segment_name(closed.pk)))
+
+        # More workers than stripes: the last ones count into the base
+        candidate_ids = list(poll.candidates.order_by("pk").values_list("pk", flat=True))
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=count_votes, args=(poll.pk, candidate_ids, 300))
+                   for _ in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+
+        self.assertEqual(tally.poll_totals(poll), dict.fromkeys(candidate_ids, 600))
+
+    def test_only_open_polls_get_segments(self):
+        poll = open_poll(candidates=1, voters=0)
+        closed = Poll.objects.create(name="Closed poll", start_time=datetime.time(0, 0),
+                                     end_time=datetime.time(0, 0))
+        candidate = poll.candidates.get()
+        for poll_id in (poll.pk, closed.pk):
+            self.addCleanup(tally.drop, poll_id)
+
+        # Reading results or voting in a closed poll creates nothing
+        self.assertIsNone(tally.poll_totals(closed))
+        tally.record_vote(closed.pk, candidate.pk)
+        self.assertIsNone(tally._attach(tally.segment_name(closed.pk)))
+        # An open poll without votes is counted from the database too
+        self.assertIsNone(tally.poll_totals(poll))
+        self.assertIsNone(tally._attach(tally.segment_name(poll.pk)))
+
+        tally.record_vote(poll.pk, candidate.pk)  # built from the database, which has the vote
+        tally.record_vote(poll.pk, candidate.pk)
+        self.assertEqual(tally.poll_totals(poll), {candidate.pk: 1})
+
+        # Once closed, its segment and lock file go
+        Poll.objects.filter(pk=poll.pk).update(end_time=datetime.time(0, 0))
+        poll.refresh_from_db()
+        self.assertIsNone(tally.poll_totals(poll))
+        self.assertIsNone(tally._attach(tally.segment_name(poll.pk)))
+        self.assertFalse(os.path.exists(tally.segment_lock_path(tally.segment_name(poll.pk))))
+
+
+class CountCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.poll = open_poll(candidates=3, voters=2)
+        Poll.objects.filter(pk=self.poll.pk).update(voting_method=Poll.VotingMethod.IRV)
+        self.poll.refresh_from_db()
+        self.candidate_ids = list(self.poll.candidates.order_by("pk").values_list("pk", flat=True))
+
+    def cast_ballot(self, voter):
+        vote = Vote.objects.create(poll=self.poll, candidate_id=self.candidate_ids[0], voted_by=voter)
+        Ballot.objects.create(vote=vote, poll=self.poll, rankings=counting.pack_rankings(self.candidate_ids))
+
+    def test_count_is_reused_until_another_ballot(self):
+        first, second = self.poll.voters.all()
+        self.cast_ballot(first)
+        with mock.patch.object(counting, "count_poll", wraps=counting.count_poll) as count_poll:
+            result = counting.cached_count_poll(self.poll)
+            self.assertEqual(counting.cached_count_poll(self.poll), result)
+            self.assertEqual(count_poll.call_count, 1)
+
+            self.cast_ballot(second)
+            self.assertEqual(counting.cached_count_poll(self.poll)["ballots"], 2)
+            self.assertEqual(count_poll.call_count, 2)
+
+
+@skipUnless(middleware.brotli, "brotli is not installed")
+class CompressionTests(TestCase):
+
+    def compress(self, vary=None):
+        def page(request):
+            response = HttpResponse("<p>Results</p>" * 200)
+            if vary:
+                response["Vary"] = vary
+            return response
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip, br")
+        return middleware.CompressionMiddleware(page)(request)
+
+    def test_shared_pages_use_brotli(self):
+        self.assertEqual(self.compress()["Content-Encoding"], "br")
+
+    def test_pages_with_secrets_get_padded_gzip(self):
+        first, second = self.compress(vary="Cookie"), self.compress(vary="Cookie")
+        self.assertEqual(first["Content-Encoding"], "gzip")
+        # The random padding makes every copy of the same page differ
+        self.assertNotEqual(first.content, second.content)
+
+
+class InvitationTests(TestCase):
+
+    def test_smtp_errors_are_logged(self):
+        poll = open_poll(candidates=1, voters=2)
+        self.client.force_login(User.objects.create_user(email="admin@example.com", password="pw"))
+        with mock.patch("voting.views.send_mail", side_effect=[1, smtplib.SMTPRecipientsRefused({})]), \
+                self.assertLogs("voting.views", "ERROR") as logs:
+            self.client.get(reverse("voting:send-email", args=[poll.pk]))
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(Voter.objects.filter(poll=poll, email_sent=True).count(), 1)
+
+
+@plain_static
+class VoterBulkActionTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(email="admin@example.com", password="pw"))
+        self.poll = open_poll(voters=2)
+        self.url = reverse("voting:bulk-voters", args=[self.poll.pk])
+
+    def test_removed_voters_are_listed_and_restored(self):
+        removed, _ = self.poll.voters.order_by("pk")
+        Voter.objects.filter(pk=removed.pk).soft_delete()
+        response = self.client.get(self.poll.get_absolute_url())
+        self.assertEqual(list(response.context["removed_voters"]), [removed])
+        self.client.post(self.url, {"action": "restore", "voters": [removed.uuid]})
+        self.assertEqual(self.poll.voters.count(), 2)
+
+    def test_moved_voters_are_invited_again(self):
+        target = open_poll(name="Other poll", voters=0)
+        Voter.objects.filter(poll=self.poll).update(email_sent=True)
+        self.client.post(self.url, {"action": "move", "selection": "all", "target_poll": target.pk})
+        self.assertEqual(target.voters.filter(email_sent=False).count(), 2)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(email="admin@example.com", password="pw"))
+        self.poll = open_poll()
+        cast_votes(self.client, self.poll)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(f"voting:export-{name}", args=[self.poll.pk]), params)
+        self.assertIn(f'filename="poll-{self.poll.pk}-{name}.', response["Content-Disposition"])
+        return b"".join(response.streaming_content).decode()
+
+    def test_voters_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export("voters"))))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(list(rows[0]), ["uuid", "email", "first_name", "last_name", "phone_number",
+                                         "is_voted", "email_sent"])
+        self.assertEqual({row["is_voted"] for row in rows}, {"True"})
+
+    def test_votes_jsonl(self):
+        rows = [json.loads(line) for line in self.export("votes", format="jsonl").splitlines()]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row["candidate"] for row in rows}, {self.poll.candidates.first().name})
+
+    def test_turnout_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.export("turnout"))))
+        self.assertEqual(sum(int(row["votes"]) for row in rows), 4)
+
+    def test_login_is_required(self):
+        self.client.logout()
+        response = self.client.get(reverse("voting:export-voters", args=[self.poll.pk]))
+        self.assertEqual(response.status_code, 302)
+
+
+@plain_static
+class ImportTests(TestCase):
+
+    def row(self, email, phone=""):
+        return {"email": email, "first_name": "Ada", "last_name": "Obi", "phone_number": phone}
+
+    def prepare(self, poll, rows, region=None):
+        registered = importing.registered_voters([row["email"] for row in rows], [poll.pk])
+        return importing.prepare_register(rows, poll.pk, registered, region)
+
+    def test_duplicates_and_registered_voters_are_rejected(self):
+        poll = open_poll(voters=1)
+        registered = poll.voters.get()
+        other = open_poll(name="Other poll", voters=0)
+        report = self.prepare(other, [
+            self.row("Jane.Doe@gmail.com"),
+            self.row("jane.doe@gmail.com"),
+            self.row("janedoe+polls@googlemail.com"),
+            self.row(registered.email.upper()),
+            self.row("not an address"),
+        ])
+        self.assertEqual([email for email, _, _, _ in report.valid], ["jane.doe@gmail.com"])
+        reasons = [reason for _, _, reason in report.rejected]
+        self.assertEqual(reasons, ["duplicate of line 2", "same mailbox as jane.doe@gmail.com on line 2",
+                                   "already registered for another poll", "invalid email address"])
+
+    def test_mailbox_of_a_registered_voter_is_rejected(self):
+        poll = open_poll(voters=0)
+        Voter.objects.create(poll=poll, email="janedoe@gmail.com", first_name="Jane", last_name="Doe")
+        report = self.prepare(poll, [self.row("jane.doe+news@gmail.com")])
+        self.assertEqual(report.rejected, [(2, "jane.doe+news@gmail.com",
+                                            "same mailbox as registered voter janedoe@gmail.com")])
+
+    def test_phone_numbers_are_normalized(self):
+        poll = open_poll(voters=0)
+        Voter.objects.create(poll=poll, email="a@example.com", first_name="Ada", last_name="Obi",
+                             phone_number="+2348031234567")
+        report = self.prepare(poll, [
+            self.row("b@example.com", "0803 123 4567"),
+            self.row("c@example.com", "+234 (803) 765-4321"),
+            self.row("d@example.com", "+234 803 765 4321"),
+            self.row("e@example.com", "12345"),
+        ], region="NG")
+        self.assertEqual([str(phone) for _, _, _, phone in report.valid],
+                         ["+2348031234567", "+2348037654321", "+2348037654321"])
+        self.assertEqual([reason for _, _, reason in report.warnings],
+                         ["phone number already used by a voter of this poll", "phone number also on line 3"])
+        self.assertEqual(report.rejected, [(5, "e@example.com", "invalid phone number '12345'")])
+
+    def test_upload_creates_the_valid_voters(self):
+        self.client.force_login(User.objects.create_user(email="admin@example.com", password="pw"))
+        poll = Poll.objects.create(name="Closed poll", start_time=datetime.time(0, 0), end_time=datetime.time(0, 0))
+        upload = SimpleUploadedFile("voters.csv", b"email,first_name,last_name,phone_number\n"
+                                                  b"a@example.com,Ada,Obi,\nA@example.com,Ada,Obi,\n")
+        self.client.post(reverse("voting:import-voters", args=[poll.pk]), {"csv_file": upload})
+        self.assertEqual(list(poll.voters.values_list("email", flat=True)), ["a@example.com"])
+
+
+class ReceiptLookupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        caches["ratelimit"].clear()
+        self.poll = open_poll(voters=1)
+        cast_votes(self.client, self.poll)
+        self.vote = Vote.objects.get()
+
+    def lookup(self, code):
+        return self.client.get(reverse("voting:receipt", args=[code]))
+
+    def test_recorded_vote_is_found_without_its_candidate(self):
+        code = self.vote.receipt_code
+        response = self.lookup(f"{code[:4].lower()}-{code[4:]}")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["receipt"], data["recorded"], data["poll"]), (code, True, self.poll.name))
+        self.assertEqual(data["ledger"]["sequence"], 0)
+        self.assertEqual(set(data), {"receipt", "recorded", "poll", "cast_at", "ledger"})
+        # Served from the cache from now on
+        with self.assertNumQueries(0):
+            self.assertEqual(self.lookup(code).json(), data)
+
+    def test_unknown_receipt_is_not_found(self):
+        response = self.lookup("not-a-receipt")
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.json()["recorded"])
+
+    @override_settings(RECEIPT_LOOKUPS_PER_MINUTE=2)
+    def test_lookups_are_rate_limited(self):
+        with mock.patch("voting.views.time.time", return_value=120.0):
+            statuses = [self.lookup(self.vote.receipt_code).status_code for _ in range(3)]
+            self.assertEqual(statuses, [200, 200, 429])
+            self.assertEqual(self.lookup(self.vote.receipt_code)["Retry-After"], "60")
+        # The next minute starts a new count
+        with mock.patch("voting.views.time.time", return_value=180.0):
+            self.assertEqual(self.lookup(self.vote.receipt_code).status_code, 200)
+
+
+class ProvisioningTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write_manifest(self, polls):
+        path = os.path.join(self.directory, "manifest.json")
+        with open(path, "w") as fh:
+            json.dump({"polls": polls}, fh)
+        return path
+
+    def test_polls_candidates_and_voters_are_created(self):
+        with open(os.path.join(self.directory, "union.csv"), "w") as fh:
+            fh.write("email,first_name,last_name,phone_number\nbola@example.com,Bola,Ade,\n")
+        path = self.write_manifest([
+            {"name": "Union", "start_time": "08:00", "end_time": "16:00", "candidates": ["Ada Obi"],
+             "voters": [{"email": "ada@example.com", "first_name": "Ada", "last_name": "Obi"}],
+             "voters_csv": "union.csv"},
+            {"name": "Senate", "start_time": "08:00", "end_time": "16:00", "voting_method": "approval",
+             "candidates": [{"name": "Chidi Eze"}, "Bola Ade"],
+             "voters": [{"email": "ADA@example.com", "first_name": "Ada", "last_name": "Obi"}]},
+        ])
+        stderr = io.StringIO()
+        call_command("provision_polls", path, stdout=io.StringIO(), stderr=stderr)
+        union, senate = Poll.objects.order_by("pk")
+        self.assertEqual((union.name, senate.voting_method), ("Union", "approval"))
+        self.assertEqual(senate.candidates.count(), 2)
+        self.assertEqual(sorted(union.voters.values_list("email", flat=True)),
+                         ["ada@example.com", "bola@example.com"])
+        # Voters of one poll of the manifest count as registered for the next
+        self.assertFalse(senate.voters.exists())
+        self.assertIn("already registered for another poll", stderr.getvalue())
+
+    def test_invalid_manifest_creates_nothing(self):
+        Candidate.objects.create(name="Ada Obi", poll=open_poll(candidates=0, voters=0))
+        path = self.write_manifest([
+            {"name": "Union", "start_time": "08:00", "end_time": "16:00", "candidates": ["Ada Obi"]},
+            {"name": "Union", "start_time": "soon", "colour": "red"},
+        ])
+        with self.assertRaises(CommandError) as raised:
+            call_command("provision_polls", path)
+        errors = str(raised.exception)
+        for expected in ["polls[1]: same name as polls[0]", "polls[1]: unknown field(s) colour",
+                         "polls[1].start_time", "candidate 'Ada Obi' already exists"]:
+            self.assertIn(expected, errors)
+        self.assertEqual(Poll.objects.count(), 1)
+
+    def test_dry_run_creates_nothing(self):
+        path = self.write_manifest([{"name": "Union", "start_time": "08:00", "end_time": "16:00"}])
+        stdout = io.StringIO()
+        call_command("provision_polls", path, dry_run=True, stdout=stdout)
+        self.assertIn("Would create 1 poll(s)", stdout.getvalue())
+        self.assertFalse(Poll.objects.filter(name="Union").exists())
+
+
+@plain_static
+class AdminTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser(email="admin@example.com", password="pw"))
+        self.poll = open_poll(voters=5)
+
+    def test_large_unfiltered_counts_are_estimated(self):
+        for i in range(4):
+            open_poll(name=f"Poll {i}", candidates=0, voters=0)
+        polls = Poll.all_objects.order_by("pk")
+        Poll.all_objects.filter(pk__in=list(polls.values_list("pk", flat=True)[:2])).delete()
+        with mock.patch.object(admin.EstimatedCountPaginator, "exact_count_threshold", 2):
+            # SQLite: the highest rowid stands in for the table size
+            self.assertEqual(admin.EstimatedCountPaginator(polls, 50).count, polls.last().pk)
+            self.assertEqual(admin.EstimatedCountPaginator(polls.filter(name__startswith="Poll"), 50).count, 3)
+        self.assertEqual(admin.EstimatedCountPaginator(polls, 50).count, 3)
+
+    def test_changelist_lists_and_restores_soft_deleted_voters(self):
+        voter = self.poll.voters.order_by("pk").first()
+        Voter.objects.filter(pk=voter.pk).soft_delete()
+        url = reverse("admin:voting_voter_changelist")
+        response = self.client.get(url, {"is_deleted__exact": "1"})
+        self.assertEqual(list(response.context["cl"].result_list), [Voter.all_objects.get(pk=voter.pk)])
+
+        self.client.post(url, {"action": "restore_selected", "_selected_action": [voter.pk]})
+        self.assertEqual(self.poll.voters.count(), 5)
+
+    def test_soft_deleting_a_poll_removes_its_voters(self):
+        self.client.post(reverse("admin:voting_poll_changelist"),
+                         {"action": "soft_delete_selected", "_selected_action": [self.poll.pk]})
+        self.assertTrue(Poll.all_objects.get(pk=self.poll.pk).is_deleted)
+        self.assertFalse(Voter.objects.filter(poll=self.poll).exists())
+        self.assertEqual(Voter.all_objects.filter(poll=self.poll).count(), 5)
+
+
+@plain_static
+class VoterSessionTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(email="admin@example.com", password="pw"))
+        self.poll = open_poll(voters=1)
+        self.voter = self.poll.voters.get()
+
+    def test_ballot_pages_skip_the_session_store(self):
+        url = reverse("voting:vote", kwargs={"pk": self.poll.pk, "voter_pk": self.voter.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            response = self.client.post(url, {"candidate": self.poll.candidates.first().pk}, follow=True)
+        self.assertTemplateUsed(response, "voting/vote-success.html")
+        self.assertFalse([query for query in queries if "django_session" in query["sql"]])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        # The admin's session is not even read there
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    def test_other_pages_keep_the_session(self):
+        response = self.client.get(reverse("voting:poll-list"))
+        self.assertTrue(response.wsgi_request.user.is_authenticated)
+
+
+class TurnoutTests(TestCase):
+
+    def setUp(self):
+        self.poll = open_poll()
+        cast_votes(self.client, self.poll)
+        # Spread the votes over 08:00, 08:01, 08:14 and 08:15
+        start = datetime.datetime(2024, 5, 1, 8, 0, tzinfo=datetime.timezone.utc)
+        for minutes, vote in zip([0, 1, 14, 15], Vote.objects.filter(poll=self.poll).order_by("pk")):
+            Vote.objects.filter(pk=vote.pk).update(date_created=start + datetime.timedelta(minutes=minutes))
+
+    def series(self, **params):
+        return self.client.get(reverse("voting:poll-turnout", args=[self.poll.pk]), params)
+
+    def test_votes_are_counted_per_minute(self):
+        self.assertEqual(sum(TurnoutBucket.objects.filter(poll=self.poll).values_list("count", flat=True)), 4)
+        call_command("rollup_turnout", poll=[self.poll.pk], stdout=io.StringIO())
+        self.assertEqual(TurnoutBucket.objects.filter(poll=self.poll).count(), 4)
+
+    def test_series_is_downsampled(self):
+        TurnoutBucket.rebuild(self.poll)
+        series = self.series(resolution=15).json()["series"]
+        self.assertEqual([(point["votes"], point["cumulative"]) for point in series], [(3, 3), (1, 4)])
+        self.assertEqual(len(self.series(resolution=1).json()["series"]), 4)
+
+    def test_resolution_is_bounded(self):
+        for resolution in ["0", "1441", "soon"]:
+            self.assertEqual(self.series(resolution=resolution).status_code, 400)
+
+
+class WarmUpTests(TestCase):
+
+    def test_project_templates_are_compiled(self):
+        names = list(warmup.template_names())
+        self.assertIn("voting/vote_form.html", names)
+        self.assertFalse([name for name in names if name.startswith("admin/")])
+        self.assertEqual(warmup.warm_up(connect=False), len(names))
+
+    def test_templates_are_compiled_once_per_process(self):
+        first, again = get_template("voting/vote_form.html"), get_template("voting/vote_form.html")
+        self.assertIs(first.template, again.template)
@@ -19,12 +19,18 @@ urlpatterns = [
     path('polls/<int:pk>/delete', views.PollDeleteView.as_view(), name='poll-delete'),
     path('polls/<int:pk>/candidates/', views.CandidateListView.as_view(), name='list-candidate'),
     path('polls/<int:pk>/voters/<uuid:voter_pk>/delete/', views.VoterDeleteView.as_view(), name='remove_voter'),
+    path('polls/<int:pk>/voters/bulk/', views.VoterBulkActionView.as_view(), name='bulk-voters'),
     path('polls/<int:pk>/import/', views.VoterImportView.as_view(), name='import-voters'),
     # path('polls/<int:pk>/voters', views.voter_detail_view, name="voter-detail"),
     path('polls/<int:pk>/result/', views.PollResultView.as_view(), name='poll-result'),
+    path('polls/<int:pk>/turnout/', views.TurnoutSeriesView.as_view(), name='poll-turnout'),
+    path('polls/<int:pk>/export/voters/', views.VoterExportView.as_view(), name='export-voters'),
+    path('polls/<int:pk>/export/votes/', views.VoteExportView.as_view(), name='export-votes'),
+    path('polls/<int:pk>/export/turnout/', views.TurnoutExportView.as_view(), name='export-turnout'),
     path('polls/<int:pk>/voters/<uuid:voter_pk>/vote', views.VoteView.as_view(), name="vote"),
     path("send-email/<int:pk>", views.SendEmailView.as_view(), name="send-email"),
     path("vote_success/", views.vote_success, name="vote-success"),
+    path("receipts/<str:code>/", views.ReceiptLookupView.as_view(), name="receipt"),
 ]
 # handler404 = "views.custom_404"
 
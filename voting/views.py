@@ -1,11 +1,14 @@
 from typing import Any
 import csv
+import json
+import logging
 import smtplib
+import time
 from datetime import datetime, timedelta
 
 from django.forms.models import BaseModelForm
 from django.shortcuts import render
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.http import Http404
 from django.contrib.sites.shortcuts import get_current_site
@@ -18,15 +21,28 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import authenticate, login, logout
 from django.urls import reverse_lazy, reverse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.contrib import messages
+from django.core.cache import cache, caches
+from django.core.files.storage import default_storage
 from django.core.mail import send_mail
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_protect
-from django.db.models import Count, Max
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncHour
 from urllib.parse import urlencode, unquote
 
 from .forms import VoterUploadForm, PollForm
-from voting.models import Poll, Voter, Candidate, Vote
+from e_voting.db_routers import read_database
+from voting import images, importing, ledger, tally
+from voting.counting import cached_count_poll, pack_rankings
+from voting.models import (
+    Poll, PollArchive, Voter, Candidate, Vote, Ballot, TurnoutBucket, LedgerEntry, normalize_receipt_code,
+)
+
+logger = logging.getLogger(__name__)
 
 
 now = timezone.now().time()
@@ -74,6 +90,14 @@ class PollDetailView(LoginRequiredMixin, DetailView):
     model = Poll
     template_name = 'voting/poll_detail.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Polls voters can be moved to with the bulk actions
+        context["other_polls"] = Poll.objects.exclude(pk=self.object.pk).only("id", "name")
+        # Removed voters, listed so they can be ticked and restored
+        context["removed_voters"] = Voter.all_objects.filter(poll=self.object, is_deleted=True)
+        return context
+
 
 class PollCreateView(LoginRequiredMixin, CreateView):
     model = Poll
@@ -120,26 +144,26 @@ class PollDeleteView( LoginRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         poll = form.save(commit=False)
-        poll.is_deleted = True
-        poll.save()
+        with transaction.atomic():
+            Poll.objects.filter(pk=poll.pk).soft_delete()
+            poll.voters.soft_delete()
         return redirect('voting:poll-list')
 
 
 class CandidateCreateView(LoginRequiredMixin, CreateView):
     model = Candidate
-    fields = ["name"]
+    # The form's ImageField only accepts files Pillow can open, with an
+    # image extension
+    fields = ["name", "image"]
 
-    def post(self, request, *args, **kwargs):
-        # queryset = Candidate.objects.filter(poll_id=self.kwargs["pk"])
-        poll = Poll.objects.get(id=self.kwargs["pk"])
-        name = request.POST.get("name")
-        candidate = Candidate.objects.create(name=name, poll=poll)
-        candidate.save()
+    def form_valid(self, form):
+        poll = get_object_or_404(Poll, id=self.kwargs["pk"])
+        form.instance.poll = poll
+        candidate = form.save()
+        if candidate.image:
+            images.schedule_candidate_image(candidate)
         messages.info(self.request, f"Candidate succesfully added to {poll.name}.")
-        return redirect("voting:poll-list")
-
-    def get_success_url(self) -> str:
-        return reverse_lazy("voting:poll-list")
+        return redirect(poll)
 
 
 class CandidateListView(LoginRequiredMixin, ListView):
@@ -185,86 +209,269 @@ class VoterCreateView(LoginRequiredMixin, CreateView):
 class VoterDeleteView(View):
 
     def get(self, request, *args, **kwargs):
-        queryset = Voter.objects.filter(poll=kwargs["pk"])
-        voter = get_object_or_404(queryset, pk=kwargs['voter_pk'])
+        queryset = Voter.objects.filter(poll=kwargs["pk"], pk=kwargs['voter_pk'])
 
         # if voter.poll.is_active:
         #     raise Http404("Cannot delete a voter on an active poll")
-        
-        voter.is_deleted = True
-        voter.save()
+
+        if not queryset.soft_delete():
+            raise Http404("Voter not found.")
         return redirect('voting:poll-list')
 
 
-class SendEmailView(LoginRequiredMixin, View):
+class VoterBulkActionView(LoginRequiredMixin, View):
+    """ Apply one action to many voters of a poll at once
 
-    def get(self, request, *args, **kwargs):
-        voters = Voter.objects.filter(poll_id=self.kwargs["pk"])
-        poll_id = self.kwargs["pk"]
-        poll = Poll.objects.get(id=poll_id)
-        # .values_list("email", flat=True)
-        
-        current_site = get_current_site(request).domain
-        
-        for voter in voters:
-            # poll_id = voter.poll.id
-            voter_id = voter.uuid
-            voter_email = voter.email
-            poll_link = reverse('voting:vote', args=[poll_id, voter_id])
-            voter_link = urlencode({'url': poll_link}) 
-            # Send the poll email to the voter
-            try:
-                send_mail(
-                    subject='Poll Notification',
-                    message=f'Please participate in the poll. Click the link below:\n\n{current_site}{poll_link}',
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[voter_email],
-                    
-                )
-                messages.info(self.request, f"Email Notification for {poll.name} poll in progress....") 
-            except smtplib.SMTPException as e:
-                messages.error(self.request, "An SMTP error occured")
-                print(f"An error occured: {e}")
+    Voters are picked either by uuid (``voters``) or by one of the
+    ``selections`` below, and are updated in bounded chunks.
+    """
+    selections = {
+        "all": {},
+        "not_voted": {"is_voted": False},
+        "email_not_sent": {"email_sent": False},
+    }
+    actions = ["delete", "restore", "resend", "move"]
+
+    def get_voters(self, poll, action, selection):
+        # Restoring works on tombstones, everything else on live voters
+        if action == "restore":
+            queryset = Voter.all_objects.filter(poll=poll, is_deleted=True)
+        else:
+            queryset = Voter.objects.filter(poll=poll)
+        if selection == "selected":
+            return queryset.filter(pk__in=self.request.POST.getlist("voters"))
+        return queryset.filter(**self.selections[selection])
+
+    def post(self, request, *args, **kwargs):
+        poll = get_object_or_404(Poll, pk=self.kwargs["pk"])
+        action = request.POST.get("action")
+        selection = request.POST.get("selection", "selected")
+        if action not in self.actions or (selection != "selected" and selection not in self.selections):
+            messages.error(request, "Unknown bulk action.")
+            return redirect("voting:poll-detail", pk=poll.pk)
+
+        try:
+            voters = self.get_voters(poll, action, selection)
+            if action == "delete":
+                count = voters.soft_delete()
+                messages.info(request, f"{count} voter(s) removed from {poll.name}.")
+            elif action == "restore":
+                count = voters.restore()
+                messages.info(request, f"{count} voter(s) restored to {poll.name}.")
+            elif action == "resend":
+                send_poll_invitations(request, poll, voters)
+            else:
+                target = get_object_or_404(Poll, pk=request.POST.get("target_poll"))
+                # Voters who already voted keep their ballot on this poll; the
+                # others need an invitation to the new one
+                count = voters.filter(is_voted=False).update_in_chunks(poll=target, email_sent=False)
+                messages.info(request, f"{count} voter(s) moved to {target.name}.")
+        except ValidationError:
+            messages.error(request, "Invalid voter selection.")
+        return redirect("voting:poll-detail", pk=poll.pk)
+
+
+def send_poll_invitations(request, poll, voters):
+    """ Email each of ``voters`` their ballot link and flag who was reached
+
+    Adds a single summary message rather than one per voter.
+    """
+    current_site = get_current_site(request).domain
+    sent = []
+    failed = 0
+
+    for voter_id, voter_email in voters.values_list("uuid", "email").iterator():
+        poll_link = reverse('voting:vote', args=[poll.id, voter_id])
+        # Send the poll email to the voter
+        try:
+            send_mail(
+                subject='Poll Notification',
+                message=f'Please participate in the poll. Click the link below:\n\n{current_site}{poll_link}',
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[voter_email],
+            )
+            sent.append(voter_id)
+        except smtplib.SMTPException:
+            failed += 1
+            logger.exception("Could not send the invitation of voter %s to poll %s", voter_id, poll.pk)
+
+    Voter.all_objects.filter(pk__in=sent).update_in_chunks(email_sent=True)
+    messages.info(request, f"Poll Notification for {poll.name} sent to {len(sent)} voter(s).")
+    if failed:
+        messages.error(request, f"An SMTP error occured for {failed} voter(s).")
+    return len(sent)
 
 
-            finally:
-                Voter.objects.values_list("email", flat=True).update(email_sent=True)
-        messages.info(self.request, f"Poll Notification for {poll.name} sent successfully.")
+class SendEmailView(LoginRequiredMixin, View):
+
+    def get(self, request, *args, **kwargs):
+        poll = get_object_or_404(Poll, id=self.kwargs["pk"])
+        send_poll_invitations(request, poll, poll.voters.all())
         return redirect(reverse_lazy("voting:poll-list"))
     
 
+def serve_media(request, path):
+    """ Candidate photos as processed by ``voting.images``, read from the
+    default storage.
+
+    Only the re-encoded, content-hashed files are served, with a content
+    type fixed by their extension: raw uploads never reach a browser. In
+    production point MEDIA_URL at the storage, or a CDN in front of it, and
+    leave SERVE_MEDIA empty.
+    """
+    content_type = images.processed_content_type(path)
+    if content_type is None or not default_storage.exists(path):
+        raise Http404("No such photo")
+    response = FileResponse(default_storage.open(path, "rb"), content_type=content_type)
+    response["X-Content-Type-Options"] = "nosniff"
+    response["Content-Security-Policy"] = "default-src 'none'; sandbox"
+    patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_SECONDS, immutable=True)
+    return response
+
+
+@cache_control(private=True, no_store=True)
 def vote_success(request):
-    return render(request, 'voting/vote-success.html')
+    receipt = normalize_receipt_code(request.GET.get("receipt", ""))
+    return render(request, 'voting/vote-success.html', {"receipt": receipt})
+
+
+def client_ip(request):
+    """ Address of the client; behind the Heroku router that is the last
+    X-Forwarded-For hop, which the client cannot forge """
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+class ReceiptLookupView(View):
+    """ Confirm that the vote behind a receipt code was recorded.
+
+    The code is unique-indexed, so a lookup is one index probe; found
+    receipts are cached since they never change. The response names the
+    poll and ledger position but never the candidate. Lookups are limited
+    to ``RECEIPT_LOOKUPS_PER_MINUTE`` per client to keep codes unguessable,
+    counted in the ``ratelimit`` cache: per process unless there is a
+    ``CACHE_URL``.
+    """
+    cache_prefix = "receipt"
+
+    def is_rate_limited(self, request):
+        window = int(time.time() // 60)
+        key = f"{self.cache_prefix}-rate:{client_ip(request)}:{window}"
+        # add() only sets a missing key, so the count starts once per window
+        counts = caches["ratelimit"]
+        counts.add(key, 0, timeout=60)
+        try:
+            return counts.incr(key) > settings.RECEIPT_LOOKUPS_PER_MINUTE
+        except ValueError:
+            # Expired between add() and incr()
+            return False
+
+    def get(self, request, *args, **kwargs):
+        if self.is_rate_limited(request):
+            response = JsonResponse({"error": "Too many lookups, try again shortly."}, status=429)
+            response["Retry-After"] = str(60 - int(time.time()) % 60)
+            patch_cache_control(response, no_store=True)
+            return response
+
+        code = normalize_receipt_code(kwargs["code"])
+        key = f"{self.cache_prefix}:{code}"
+        data = cache.get(key) if code else None
+        if data is None and code:
+            vote = (
+                Vote.objects.filter(receipt_code=code)
+                .values("pk", "poll_id", "poll__name", "date_created")
+                .first()
+            )
+            if vote is not None:
+                entry = (
+                    LedgerEntry.objects.filter(poll_id=vote["poll_id"], vote_id=vote["pk"])
+                    .values("sequence", "entry_hash")
+                    .first()
+                )
+                data = {
+                    "receipt": code,
+                    "recorded": True,
+                    "poll": vote["poll__name"],
+                    "cast_at": vote["date_created"].isoformat(),
+                    "ledger": entry,
+                }
+                cache.set(key, data, timeout=settings.RECEIPT_CACHE_SECONDS)
+
+        if data is None:
+            response = JsonResponse({"receipt": kwargs["code"], "recorded": False}, status=404)
+            # Short, so a receipt looked up just before its vote commits is found soon after
+            patch_cache_control(response, public=True, max_age=30)
+            return response
+        response = JsonResponse(data)
+        patch_cache_control(response, public=True, max_age=settings.RECEIPT_CACHE_SECONDS)
+        return response
      
 
+@method_decorator(cache_control(private=True, no_store=True), name="dispatch")
 class VoteView(View):
+    """ The ballot: personal to one voter, so never stored by any cache """
+
+    def get_choices(self, request, poll):
+        """ Candidate ids chosen on the ballot, most preferred first """
+        field = "ranking" if poll.voting_method in (Poll.VotingMethod.IRV, Poll.VotingMethod.STV) else "candidate"
+        submitted = [value for value in request.POST.getlist(field) if value]
+        if not poll.uses_ballots:
+            submitted = submitted[:1]
+        if not submitted:
+            raise ValidationError("You didn't select a candidate.")
+        if len(set(submitted)) != len(submitted):
+            raise ValidationError("Each candidate can only be chosen once.")
+        valid = {str(pk) for pk in poll.candidates.values_list("pk", flat=True)}
+        if not set(submitted) <= valid:
+            raise ValidationError("You didn't select a candidate.")
+        return [int(value) for value in submitted]
 
     def post(self, request, *args, **kwargs):
         voter = get_object_or_404(Voter, pk=kwargs['voter_pk'])
         poll = voter.poll
         
         try:
-            selected_candidate = poll.candidates.get(pk=request.POST.get("candidate"))
+            choices = self.get_choices(request, poll)
 
-        except (KeyError, Candidate.DoesNotExist):
+        except ValidationError as e:
             return render(
                 request,
                 "voting/vote_form.html",
                 {
                     "poll": poll,
-                    "error_message": "You didn't select a candidate.",
+                    "voter": voter,
+                    "candidates": poll.candidates.all(),
+                    "error_message": e.message,
                 },
             )
 
-        if Vote.objects.filter(poll=poll, voted_by=voter).exists():
-            return render(request, "voting/already_voted.html")
-        
-        vote = Vote(poll=poll, candidate=selected_candidate, voted_by=voter)
-        vote.save()
-        voter.cast_vote()
-
-        # return redirect('voting:vote-success')
-        return redirect('voting:vote-success')
+        with transaction.atomic():
+            # Before any insert: see ledger.lock_poll
+            ledger.lock_poll(poll.pk)
+            # Checked under the lock, which a concurrent submission of the
+            # same voter holds until its vote commits. Never trust a replica
+            # here: it may not have the voter's vote yet.
+            if Vote.objects.using("default").filter(poll=poll, voted_by=voter).exists():
+                return render(request, "voting/already_voted.html")
+            # Checked under the lock archive_poll takes before it deletes
+            if PollArchive.objects.filter(poll=poll, restored_at__isnull=True).exists():
+                raise Http404("This poll has been archived.")
+            # The first choice doubles as the plurality vote
+            vote = Vote(poll=poll, candidate_id=choices[0], voted_by=voter)
+            vote.save()
+            rankings = b""
+            if poll.uses_ballots:
+                rankings = pack_rankings(choices)
+                Ballot.objects.create(vote=vote, poll=poll, rankings=rankings)
+            ledger.append_vote(vote, rankings)
+            voter.cast_vote()
+            TurnoutBucket.record(vote)
+            transaction.on_commit(lambda: tally.record_vote(vote.poll_id, vote.candidate_id))
+
+        success_url = reverse('voting:vote-success')
+        return redirect(f"{success_url}?{urlencode({'receipt': vote.receipt_code})}")
     
     
     def get(self, request, *args, **kwargs):
@@ -289,6 +496,8 @@ class VoteView(View):
 
 class VoterImportView(LoginRequiredMixin, View):
     template_name = 'voter/import_voters.html'
+    # Rejected/warned rows listed on the page; the counts cover all of them
+    report_limit = 500
 
     def get(self, request, pk):
         form = VoterUploadForm
@@ -309,57 +518,239 @@ class VoterImportView(LoginRequiredMixin, View):
             csv_file = request.FILES['csv_file']
             decoded_file = csv_file.read().decode('utf-8')
             csv_data = csv.DictReader(decoded_file.splitlines(), delimiter=',')
-            expected_headers = ["email", "first_name", "last_name", "phone_number"]
+            expected_headers = importing.EXPECTED_HEADERS
             headers = csv_data.fieldnames
             print(headers)  
             if headers != expected_headers:
                 raise ValueError('Invalid CSV file. Headers do not match. Expected headers: {}'.format(', '.join(expected_headers)))
-            
-            with transaction.atomic():
-                for row in csv_data:
-                    try:
-                        Voter.objects.create(poll=poll, first_name=row["first_name"], last_name=row["last_name"],
-                                        email=row['email'], phone_number=row['phone_number'])
-                    except IntegrityError:
-                        transaction.rollback()
-                        messages.error(
-                            request, f"Error! Error!!"
-                        )
-                        return HttpResponseRedirect(reverse("voting:poll-detail"))
-                    
-                messages.success(request, "Import successful")
-                return redirect('voting:poll-list')  # Redirect to poll detail page after successful upload
-        except csv.Error as e:
+
+            # Everything is checked up front, against the voters it could collide with
+            rows = list(csv_data)
+            registered = importing.registered_voters((row.get("email") for row in rows), [poll.pk])
+            report = importing.prepare_register(rows, poll.pk, registered)
+            if request.POST.get("validate_only"):
+                messages.info(request, f"{len(report.valid)} of {report.rows} voter(s) can be imported.")
+            else:
+                try:
+                    with transaction.atomic():
+                        Voter.objects.bulk_create(report.build_voters(), batch_size=1000)
+                except IntegrityError:
+                    messages.error(
+                        request, "Some of these voters were registered while the file was checked. "
+                                 "Nothing was imported, please upload it again."
+                    )
+                else:
+                    messages.success(request, f"Imported {len(report.valid)} of {report.rows} voter(s).")
+                    if not report.rejected and not report.warnings:
+                        return redirect('voting:poll-list')
+
+            return render(request, 'voting/import_voters.html', {
+                'form': form,
+                'report': report,
+                'rejected': report.rejected[:self.report_limit],
+                'warnings': report.warnings[:self.report_limit],
+            })
+        except (csv.Error, ValueError) as e:
+            # UnicodeDecodeError is a ValueError too
             messages.error(request, f"Error processing CSV file: {e}")
             
         return render(request, 'voting/import_voters.html', {'form': form})
 
 
-class PollResultView(View):
+def cache_poll_results(request, response, poll, archived=False):
+    """ Let browsers and shared caches keep the results of a closed poll
+    until it reopens, at most ``RESULTS_CACHE_SECONDS``.
 
-    def get(self, request, *args, **kwargs):
+    Results of an open poll are always revalidated, and pages seen by a
+    logged-in admin (or carrying someone's messages) are never shared.
+    """
+    max_age = settings.RESULTS_CACHE_SECONDS
+    if not archived:
+        max_age = min(poll.seconds_until_open(), max_age)
+    if not max_age:
+        patch_cache_control(response, no_cache=True)
+    elif settings.SESSION_COOKIE_NAME in request.COOKIES or "messages" in request.COOKIES:
+        patch_cache_control(response, private=True, max_age=max_age)
+    else:
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
 
-        poll = Poll.objects.get(pk=self.kwargs["pk"])
-        # Retrieve all the votes for the poll
-        votes = Vote.objects.filter(poll=poll)
-        
-        candidates = poll.candidates.all()
-        candidate_votes = votes.values('candidate').annotate(total_votes=Count('candidate'))
 
-        # Find the highest number of votes
-        highest_votes = candidate_votes.aggregate(max_votes=Max('total_votes'))['max_votes']
+class PollResultView(View):
 
-        # Find the candidates with the highest number of votes
-        winners = candidate_votes.filter(total_votes=highest_votes).values_list('candidate', flat=True)
+    def get(self, request, *args, **kwargs):
 
-        # Retrieve the candidate objects
-        winning_candidates = Candidate.objects.filter(pk__in=winners)
+        poll = get_object_or_404(Poll, pk=self.kwargs["pk"])
+        # Archived polls no longer have their votes in the live tables
+        archive = getattr(poll, "archive", None)
+        archived = archive is not None and not archive.is_restored
+        live_totals = None if archived else tally.poll_totals(poll)
+        if live_totals is not None:
+            # Read from the workers' shared tally, no counting query
+            candidates = list(poll.candidates.all())
+            for candidate in candidates:
+                candidate.total_votes = live_totals.get(candidate.pk, 0)
+        else:
+            # Count every candidate's votes in a single query
+            candidates = list(poll.candidates.annotate(total_votes=Count('candidate_votes')))
+
+        rounds = []
+        if archived:
+            for candidate in candidates:
+                candidate.total_votes = archive.results.get(str(candidate.pk), 0)
+            winners = archive.winners
+            total_votes = archive.vote_count
+        elif poll.uses_ballots:
+            result = cached_count_poll(poll)
+            if result["rounds"]:
+                for candidate in candidates:
+                    candidate.total_votes = int(result["rounds"][0][candidate.pk])
+            rounds = [
+                [(candidate.name, round(tallies[candidate.pk], 2)) for candidate in candidates]
+                for tallies in result["rounds"]
+            ]
+            winners = result["elected"] if result["ballots"] else []
+            total_votes = result["ballots"]
+        else:
+            # Find the candidates with the highest number of votes
+            highest_votes = max((candidate.total_votes for candidate in candidates), default=0)
+            winners = [
+                candidate.pk for candidate in candidates
+                if highest_votes and candidate.total_votes == highest_votes
+            ]
+            total_votes = sum(candidate.total_votes for candidate in candidates)
+        winning_candidates = [candidate for candidate in candidates if candidate.pk in winners]
 
         context = {
             'poll': poll,
             'winning_candidates': winning_candidates,
-            'total_votes': votes.count(),
+            'total_votes': total_votes,
             'candidates': candidates,
+            'rounds': rounds,
         }
-        return render(request, 'voting/poll_results.html', context)
+        response = render(request, 'voting/poll_results.html', context)
+        return cache_poll_results(request, response, poll, archived)
+
+
+class Echo:
+    """ File-like object that hands back what is written, for streaming csv rows """
+
+    def write(self, value):
+        return value
+
+
+class PollExportView(LoginRequiredMixin, View):
+    """ Base view streaming one poll's rows as CSV or JSONL (``?format=jsonl``)
+
+    Rows are read with ``values_list().iterator()`` so memory stays flat
+    however large the poll is.
+    """
+    chunk_size = 2000
+    export_name = None
+    columns = []
+
+    def get_rows(self, poll):
+        raise NotImplementedError
+
+    def stream_csv(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.columns)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def stream_jsonl(self, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(self.columns, row)), default=str) + "\n"
 
+    def get(self, request, *args, **kwargs):
+        poll = get_object_or_404(Poll, pk=self.kwargs["pk"])
+        # Rows are read while the response streams, after the request is routed
+        self.database = read_database()
+        rows = self.get_rows(poll)
+        if request.GET.get("format") == "jsonl":
+            content, content_type, extension = self.stream_jsonl(rows), "application/x-ndjson", "jsonl"
+        else:
+            content, content_type, extension = self.stream_csv(rows), "text/csv", "csv"
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="poll-{poll.pk}-{self.export_name}.{extension}"'
+        )
+        return response
+
+
+class VoterExportView(PollExportView):
+    export_name = "voters"
+    columns = ["uuid", "email", "first_name", "last_name", "phone_number", "is_voted", "email_sent"]
+
+    def get_rows(self, poll):
+        return (
+            Voter.objects.using(self.database).filter(poll=poll)
+            .order_by("pk")
+            .values_list(*self.columns)
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+
+class VoteExportView(PollExportView):
+    export_name = "votes"
+    columns = ["voter", "candidate", "date_created"]
+
+    def get_rows(self, poll):
+        return (
+            Vote.objects.using(self.database).filter(poll=poll)
+            .order_by("pk")
+            .values_list("voted_by__email", "candidate__name", "date_created")
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+
+class TurnoutExportView(PollExportView):
+    export_name = "turnout"
+    columns = ["hour", "votes"]
+
+    def get_rows(self, poll):
+        return (
+            TurnoutBucket.objects.using(self.database).filter(poll=poll)
+            .annotate(hour=TruncHour("minute"))
+            .values_list("hour")
+            .annotate(votes=Sum("count"))
+            .order_by("hour")
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+
+class TurnoutSeriesView(View):
+    """ Turnout of a poll over time, from its per-minute buckets
+
+    ``?resolution=<minutes>`` (1 to 1440, default 15) sets the width of each
+    point; buckets are summed into it so the series stays small.
+    """
+    default_resolution = 15
+
+    def get(self, request, *args, **kwargs):
+        poll = get_object_or_404(Poll, pk=self.kwargs["pk"])
+        try:
+            resolution = int(request.GET.get("resolution", self.default_resolution))
+        except ValueError:
+            resolution = 0
+        if not 1 <= resolution <= 1440:
+            return JsonResponse({"error": "resolution must be between 1 and 1440 minutes"}, status=400)
+
+        step = resolution * 60
+        series = {}
+        for minute, count in TurnoutBucket.objects.filter(poll=poll).values_list("minute", "count"):
+            start = int(minute.timestamp()) // step * step
+            series[start] = series.get(start, 0) + count
+
+        points = []
+        cumulative = 0
+        for start in sorted(series):
+            cumulative += series[start]
+            points.append({
+                "time": datetime.fromtimestamp(start, timezone.get_current_timezone()).isoformat(),
+                "votes": series[start],
+                "cumulative": cumulative,
+            })
+        response = JsonResponse({"poll": poll.pk, "resolution": resolution, "series": points})
+        return cache_poll_results(request, response, poll)